@@ -0,0 +1,31 @@
+"""add covering (user_id, status) index on user_vocabularies
+
+Revision ID: c3d5e7f9a1b2
+Revises: b7c9d1e2f3a4
+Create Date: 2025-08-10 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d5e7f9a1b2'
+down_revision: Union[str, Sequence[str], None] = 'b7c9d1e2f3a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Known-word lookups always filter by user and status; INCLUDE vocabulary_id so the
+    # known-word join never touches the heap
+    op.create_index(
+        'ix_user_vocabularies_user_id_status', 'user_vocabularies', ['user_id', 'status'],
+        unique=False, postgresql_include=['vocabulary_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_vocabularies_user_id_status', table_name='user_vocabularies')
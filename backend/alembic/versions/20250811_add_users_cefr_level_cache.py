@@ -0,0 +1,29 @@
+"""add cached cefr_level columns to users
+
+Revision ID: d4e6f8a0b2c3
+Revises: c3d5e7f9a1b2
+Create Date: 2025-08-11 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e6f8a0b2c3'
+down_revision: Union[str, Sequence[str], None] = 'c3d5e7f9a1b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Last calculate_user_level result; NULL computed_at means recompute on next read
+    op.add_column('users', sa.Column('cefr_level', sa.String(length=5), nullable=True))
+    op.add_column('users', sa.Column('cefr_level_computed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'cefr_level_computed_at')
+    op.drop_column('users', 'cefr_level')
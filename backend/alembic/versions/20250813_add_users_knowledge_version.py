@@ -0,0 +1,27 @@
+"""add knowledge_version to users
+
+Revision ID: f6a8b0c2d4e5
+Revises: d4e6f8a0b2c3
+Create Date: 2025-08-13 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a8b0c2d4e5'
+down_revision: Union[str, Sequence[str], None] = 'd4e6f8a0b2c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Incremented on every vocabulary/grammar write; cache entries carry the version they were built for
+    op.add_column('users', sa.Column('knowledge_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'knowledge_version')
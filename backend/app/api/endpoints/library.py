@@ -42,7 +42,7 @@ async def get_or_create_transcript(
     Returns both original and adapted versions.
     """
     try:
-        result = library_service.get_or_create_transcript(
+        result = await library_service.get_or_create_transcript(
             video_url=request.video_url,
             username=request.username,
             db=db
@@ -122,7 +122,7 @@ async def adapt_transcript_for_user(
         ai_service = AITextAdaptationService()
         
         # Use the requested unknown percentage for optimal learning
-        adaptation_result = ai_service.adapt_text_with_ai(
+        adaptation_result = await ai_service.adapt_text_with_ai(
             text=transcript["original_text"], 
             username=request.username,
             db=db,  # Pass the existing db session
@@ -132,6 +132,9 @@ async def adapt_transcript_for_user(
         if adaptation_result.get("error"):
             return {"success": False, "error": adaptation_result["error"]}
         
+        # Persist a recomputed CEFR level (get_current_level only flushes it)
+        db.commit()
+        
         adapted_text = adaptation_result.get("adapted_text", transcript["original_text"])
         
         return {
@@ -184,7 +187,7 @@ async def adapt_transcript_by_video_id(
         ai_service = AITextAdaptationService()
         
         # Use the requested unknown percentage for optimal learning
-        adaptation_result = ai_service.adapt_text_with_ai(
+        adaptation_result = await ai_service.adapt_text_with_ai(
             text=transcript["original_text"], 
             username=request.username,
             db=db,
@@ -194,6 +197,9 @@ async def adapt_transcript_by_video_id(
         if adaptation_result.get("error"):
             return {"success": False, "error": adaptation_result["error"]}
         
+        # Persist a recomputed CEFR level (get_current_level only flushes it)
+        db.commit()
+        
         adapted_text = adaptation_result.get("adapted_text", transcript["original_text"])
         
         return {
@@ -607,10 +613,18 @@ async def analyze_transcript_levels(
         ai_service = AITextAdaptationService()
         analyzed_count = 0
         
+        # All Gemini calls run concurrently (bounded by the shared Gemini queue); results keep input order
+        cefr_results = await ai_service.detect_cefr_level_batch(
+            [transcript.original_text for transcript in transcripts]
+            + [content.content for content in web_contents],
+            allow_fallback=fallback
+        )
+        transcript_results = cefr_results[:len(transcripts)]
+        web_results = cefr_results[len(transcripts):]
+        
         # Analyze transcripts
-        for transcript in transcripts:
+        for transcript, cefr_result in zip(transcripts, transcript_results):
             try:
-                cefr_result = ai_service.detect_cefr_level(transcript.original_text, allow_fallback=fallback)
                 if cefr_result.get("success") and cefr_result.get("cefr_level"):
                     transcript.cefr_level = cefr_result.get("cefr_level", transcript.cefr_level)
                     transcript.level_confidence = cefr_result.get("confidence", transcript.level_confidence)
@@ -622,9 +636,8 @@ async def analyze_transcript_levels(
                 continue
         
         # Analyze web content
-        for content in web_contents:
+        for content, cefr_result in zip(web_contents, web_results):
             try:
-                cefr_result = ai_service.detect_cefr_level(content.content, allow_fallback=fallback)
                 if cefr_result.get("success") and cefr_result.get("cefr_level"):
                     content.cefr_level = cefr_result.get("cefr_level", content.cefr_level)
                     content.level_confidence = cefr_result.get("confidence", content.level_confidence)
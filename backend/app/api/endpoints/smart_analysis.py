@@ -181,6 +181,7 @@ async def get_cache_stats(db: Session = Depends(get_db)):
     """
     try:
         stats = word_cache_service.get_cache_stats(db)
+        stats["explanation_cache"] = ai_teacher_service.get_explanation_cache_stats()
         
         return AnalysisResponse(
             success=stats.get("cache_enabled", False),
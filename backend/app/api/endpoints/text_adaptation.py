@@ -1,11 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, List, Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.services.text_adaptation_service import TextAdaptationService
 from app.services.ai_text_adaptation_service import AITextAdaptationService
 from app.services.yt_dlp_service import YTDlpService
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -98,20 +103,20 @@ async def get_user_learning_stats(username: str, db: Session = Depends(get_db))
         known_words = [row[0] for row in user_known_words]
         
         # Count words by status
-        known_count = db.query(UserVocabulary).filter(
+        known_count = db.query(func.count(UserVocabulary.id)).filter(
             UserVocabulary.user_id == user.id,
             UserVocabulary.status == "known"
-        ).count()
+        ).scalar() or 0
         
-        unknown_count = db.query(UserVocabulary).filter(
+        unknown_count = db.query(func.count(UserVocabulary.id)).filter(
             UserVocabulary.user_id == user.id,
             UserVocabulary.status == "unknown"
-        ).count()
+        ).scalar() or 0
         
-        ignore_count = db.query(UserVocabulary).filter(
+        ignore_count = db.query(func.count(UserVocabulary.id)).filter(
             UserVocabulary.user_id == user.id,
             UserVocabulary.status == "ignore"
-        ).count()
+        ).scalar() or 0
         
         # Use grammar hierarchy service for proper level calculation
         from app.services.grammar_hierarchy_service import GrammarHierarchyService
@@ -169,26 +174,27 @@ async def adapt_text_for_user(request: TextAdaptationRequest, db: Session = Depe
     Intelligently rewrites text to achieve perfect i+1 level.
     """
     try:
-        print(f"[DEBUG] Adaptation request received:")
-        print(f"  - username: {request.username}")
-        print(f"  - target_unknown_percentage: {request.target_unknown_percentage}")
-        print(f"  - text length: {len(request.text)} characters")
-        print(f"  - text preview: {request.text[:100]}...")
+        logger.debug(
+            "Adaptation request: username=%s target_unknown_percentage=%s text_length=%d",
+            request.username, request.target_unknown_percentage, len(request.text)
+        )
         
         ai_service = AITextAdaptationService()
-        result = ai_service.adapt_text_with_ai(
+        result = await ai_service.adapt_text_with_ai(
             text=request.text,
             username=request.username,
             target_unknown_percentage=request.target_unknown_percentage,
             db=db
         )
         
-        print(f"[DEBUG] Adaptation result keys: {list(result.keys())}")
-        print(f"[DEBUG] Success field: {result.get('success', 'NO SUCCESS FIELD')}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Adaptation result keys: %s", list(result.keys()))
         
         if "error" in result:
             raise HTTPException(status_code=500, detail=result["error"])
         
+        # Persist a recomputed CEFR level (get_current_level only flushes it)
+        db.commit()
         return result
         
     except HTTPException:
@@ -196,6 +202,40 @@ async def adapt_text_for_user(request: TextAdaptationRequest, db: Session = Depe
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI text adaptation failed: {str(e)}")
 
+@router.post("/adapt/stream")
+async def adapt_text_for_user_stream(request: TextAdaptationRequest, db: Session = Depends(get_db)) -> StreamingResponse:
+    """
+    🤖 Streaming variant of /adapt: adapted text is sent as plain-text chunks as each one is adapted,
+    so the first paragraphs show up without waiting for the whole adaptation.
+    """
+    from app.models.user_vocabulary import User
+    
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="No text to adapt")
+    if db.query(User.id).filter(User.username == request.username).first() is None:
+        raise HTTPException(status_code=404, detail=f"User '{request.username}' not found")
+    
+    ai_service = AITextAdaptationService()
+    stream = ai_service.adapt_text_stream(request.text, request.username, db)
+    
+    # Pull the first chunk before responding so an API error is still a proper HTTP error
+    try:
+        first_chunk = await anext(stream)
+    except StopAsyncIteration:
+        first_chunk = ""
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AI text adaptation failed: {str(e)}")
+    
+    # Persist a recomputed CEFR level (get_current_level only flushes it)
+    db.commit()
+    
+    async def body():
+        yield first_chunk
+        async for chunk in stream:
+            yield chunk
+    
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
 @router.post("/youtube")
 async def ai_adapt_youtube_for_user(request: YouTubeAdaptationRequest, db: Session = Depends(get_db)) -> Dict:
     """
@@ -206,7 +246,7 @@ async def ai_adapt_youtube_for_user(request: YouTubeAdaptationRequest, db: Sessi
     """
     try:
         ai_service = AITextAdaptationService()
-        result = ai_service.adapt_youtube_with_ai(
+        result = await ai_service.adapt_youtube_with_ai(
             youtube_url=request.youtube_url,
             username=request.username,
             target_unknown_percentage=request.target_unknown_percentage,
@@ -216,6 +256,8 @@ async def ai_adapt_youtube_for_user(request: YouTubeAdaptationRequest, db: Sessi
         if "error" in result:
             raise HTTPException(status_code=500, detail=result["error"])
         
+        # Persist a recomputed CEFR level (get_current_level only flushes it)
+        db.commit()
         return result
         
     except HTTPException:
@@ -238,7 +280,7 @@ async def explain_words(request: WordExplanationRequest) -> Dict:
     """
     try:
         ai_service = AITextAdaptationService()
-        result = ai_service.generate_learning_explanation(
+        result = await ai_service.generate_learning_explanation(
             unknown_words=request.words,
             username=request.username
         )
@@ -268,7 +310,7 @@ async def test_openai_connection(db: Session = Depends(get_db)) -> Dict:
         ai_service = AITextAdaptationService()
         
         # Simple test call
-        test_result = ai_service.adapt_text_with_ai(
+        test_result = await ai_service.adapt_text_with_ai(
             text="Hello world. This is a simple test.",
             username="ibrahim",
             target_unknown_percentage=10.0,
@@ -307,7 +349,7 @@ async def analyze_grammar(request: GrammarAnalysisRequest) -> Dict:
     """
     try:
         ai_service = AITextAdaptationService()
-        result = ai_service.analyze_grammar(request.text, request.username)
+        result = await ai_service.analyze_grammar(request.text, request.username)
         
         if "error" in result:
             raise HTTPException(status_code=500, detail=result["error"])
@@ -298,7 +298,7 @@ async def analyze_web(request: WebAnalysisRequest, db: Session = Depends(get_db)
             user = db.query(User).filter(User.id == request.user_id).first()
             username = user.username if user else "unknown"
             
-            adaptation_result = ai_service.adapt_text_with_ai(
+            adaptation_result = await ai_service.adapt_text_with_ai(
                 text=text_content,
                 username=username,
                 db=db,
@@ -306,6 +306,8 @@ async def analyze_web(request: WebAnalysisRequest, db: Session = Depends(get_db)
             )
             
             if not adaptation_result.get("error"):
+                # Persist a recomputed CEFR level (get_current_level only flushes it)
+                db.commit()
                 response_data["adaptation"] = {
                     "adapted_text": adaptation_result.get("adapted_text", text_content),
                     "original_text": text_content,  # Web içeriğinin kendisi original text
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import Optional
 import tempfile
@@ -8,6 +9,8 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.services.vocabulary_service import VocabularyService
 from app.models.user_vocabulary import User, Vocabulary, UserVocabulary
+from app.core.cache import invalidate_user_knowledge
+from app.services.grammar_hierarchy_service import GrammarHierarchyService
 
 router = APIRouter()
 
@@ -164,7 +167,9 @@ async def add_word_to_vocabulary(request: AddWordRequest, db: Session = Depends(
             # Update existing word status
             old_status = existing.status
             existing.status = request.action
+            GrammarHierarchyService.mark_level_stale(user.id, db)
             db.commit()
+            invalidate_user_knowledge(user.id)
             return {
                 "message": f"Word '{request.word}' status updated to '{request.action}'",
                 "word": request.word,
@@ -182,7 +187,9 @@ async def add_word_to_vocabulary(request: AddWordRequest, db: Session = Depends(
             status=request.action  # 'known', 'unknown', 'ignore'
         )
         db.add(user_vocab)
+        GrammarHierarchyService.mark_level_stale(user.id, db)
         db.commit()
+        invalidate_user_knowledge(user.id)
         
         return {
             "message": f"Word '{request.word}' added to vocabulary with status '{request.action}'",
@@ -210,29 +217,40 @@ async def get_user_words(username: str, db: Session = Depends(get_db)):
         if not user:
             raise HTTPException(status_code=404, detail=f"User '{username}' not found")
         
-        # Get all user vocabulary with word details
-        user_words = db.query(UserVocabulary, Vocabulary).join(
-            Vocabulary, UserVocabulary.vocabulary_id == Vocabulary.id
-        ).filter(
-            UserVocabulary.user_id == user.id
-        ).order_by(UserVocabulary.created_at.desc()).all()
+        # Get all user vocabulary with word details (only the columns we return, no ORM objects)
+        user_words = db.execute(
+            select(
+                UserVocabulary.id,
+                Vocabulary.word,
+                UserVocabulary.translation,
+                UserVocabulary.status,
+                UserVocabulary.created_at,
+                UserVocabulary.updated_at,
+                Vocabulary.id.label("vocabulary_id"),
+                Vocabulary.difficulty_level
+            ).join_from(
+                UserVocabulary, Vocabulary, UserVocabulary.vocabulary_id == Vocabulary.id
+            ).where(
+                UserVocabulary.user_id == user.id
+            ).order_by(UserVocabulary.created_at.desc())
+        ).all()
         
         # Format response
         words_list = []
-        for user_vocab, vocab in user_words:
+        for row in user_words:
             # Handle potential None values for datetime fields
-            created_at = user_vocab.created_at.isoformat() if user_vocab.created_at else ""
-            updated_at = user_vocab.updated_at.isoformat() if user_vocab.updated_at else ""
+            created_at = row.created_at.isoformat() if row.created_at else ""
+            updated_at = row.updated_at.isoformat() if row.updated_at else ""
             
             words_list.append({
-                "id": user_vocab.id,
-                "word": vocab.word,
-                "translation": user_vocab.translation or "",  # Only use user's translation
-                "status": user_vocab.status,
+                "id": row.id,
+                "word": row.word,
+                "translation": row.translation or "",  # Only use user's translation
+                "status": row.status,
                 "created_at": created_at,
                 "updated_at": updated_at,
-                "vocabulary_id": vocab.id,
-                "difficulty_level": vocab.difficulty_level or 1
+                "vocabulary_id": row.vocabulary_id,
+                "difficulty_level": row.difficulty_level or 1
             })
         
         return words_list
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 from sqlalchemy.orm import Session
+import asyncio
 import datetime
 from app.services.text_analysis_service import TextAnalysisService
 from app.services.grammar_service import GrammarService
@@ -85,9 +86,9 @@ async def save_web_content(request: WebAnalysisRequest, db: Session = Depends(ge
                 "created_at": new_content.created_at.isoformat() if new_content.created_at else None
             })
 
-        # Fetch from internet
+        # Fetch from internet (blocking HTTP, kept off the event loop)
         text_service = TextAnalysisService()
-        result = text_service.extract_web_content(url)
+        result = await asyncio.to_thread(text_service.extract_web_content, url)
         if not result.get("success"):
             raise HTTPException(status_code=400, detail=result.get("error", "Failed to extract content"))
         data = result["data"]
@@ -97,7 +98,7 @@ async def save_web_content(request: WebAnalysisRequest, db: Session = Depends(ge
         # Compute CEFR
         from app.services.ai_text_adaptation_service import AITextAdaptationService
         ai = AITextAdaptationService()
-        cefr = ai.detect_cefr_level(content_text, allow_fallback=False) if content_text else {"cefr_level": None}
+        cefr = await ai.detect_cefr_level_async(content_text, allow_fallback=False) if content_text else {"cefr_level": None}
 
         # Save
         new_content = UrlContent(
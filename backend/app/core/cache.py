@@ -0,0 +1,86 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process LRU cache with per-entry TTL
+    Used in front of expensive AI calls and DB lookups; shared by all requests in the process
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Return cached value or default if missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        """Store value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Any, default: Any = None) -> Any:
+        """Remove an entry (cache invalidation)"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[1] if entry else default
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0
+            }
+
+
+# Per-user derived knowledge (known-word sets)
+# Entries are keyed (kind, user_id), hold (users.knowledge_version, value) and are dropped on
+# every vocabulary/grammar write in this process; other processes see the bumped version
+USER_KNOWLEDGE_CACHE = TTLCache(maxsize=512, ttl=300)
+
+
+def invalidate_user_knowledge(user_id: int) -> None:
+    """Drop cached knowledge for a user after their vocabulary or grammar changes"""
+    USER_KNOWLEDGE_CACHE.pop(("known_only", user_id))
+
+
+def make_cache_key(**parts: Any) -> str:
+    """Stable sha256 key for a set of prompt inputs"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -2,7 +2,7 @@ from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, T
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index
 
 class User(Base):
     __tablename__ = "users"
@@ -16,6 +16,14 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Cached result of GrammarHierarchyService.calculate_user_level
+    # computed_at is reset to NULL on vocabulary/grammar changes
+    cefr_level = Column(String(5), nullable=True)
+    cefr_level_computed_at = Column(DateTime(timezone=True), nullable=True)
+    # Bumped with every vocabulary/grammar change; in-process knowledge caches compare it,
+    # so entries built by other workers' writes are not served stale
+    knowledge_version = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # Relationships
     vocabularies = relationship("UserVocabulary", back_populates="user")
     unknown_words = relationship("UnknownWord", back_populates="user")
@@ -36,6 +44,13 @@ class Vocabulary(Base):
 
 class UserVocabulary(Base):
     __tablename__ = "user_vocabularies"
+    __table_args__ = (
+        # Covering index: the known-word join (user_id, status -> vocabulary_id) is index-only
+        Index(
+            "ix_user_vocabularies_user_id_status", "user_id", "status",
+            postgresql_include=["vocabulary_id"]
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
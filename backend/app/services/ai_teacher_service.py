@@ -1,14 +1,401 @@
-import os
-import json
+import asyncio
 import logging
 import re
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, TypedDict
 from sqlalchemy.orm import Session
+from pydantic_core import from_json
 import google.generativeai as genai
+from app.core.cache import TTLCache, make_cache_key
+from app.services.gemini_client import get_generative_model
 from app.services.grammar_hierarchy_service import GrammarHierarchyService
 
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Grammar pattern definitions - ORDER MATTERS! (More specific first)
+_RAW_PATTERN_MAP = {
+    # Complex patterns first (to avoid false positives)
+    "present_perfect_continuous": [
+        r'\b(have|has)\s+been\s+\w+ing\b',  # have/has been + V-ing
+        r'\b(have|has)\s+been\s+\w+ing\s+(for|since)\b'  # with time expressions
+    ],
+    "present_perfect": [
+        r'\b(have|has)\s+\w+ed\b',  # have/has + past participle
+        r'\b(have|has)\s+(been|gone|done|seen|made|taken|given)\b'  # irregular verbs
+    ],
+    "past_perfect": [
+        r'\bhad\s+\w+ed\b',  # had + past participle
+        r'\bhad\s+(been|gone|done|seen|made|taken|given)\b'
+    ],
+    "time_expressions": [
+        r'\b(for|since)\s+(two|three|four|five|six|seven|eight|nine|ten|\d+)\s+(years?|months?|days?|hours?|minutes?)\b',
+        r'\b(yesterday|today|tomorrow|now|then|already|just|yet|ever|never)\b',
+        r'\b(last|next|this)\s+(year|month|week|day|time)\b'
+    ],
+    "adjective_intensifiers": [
+        r'\b(very|really|quite|extremely|incredibly|amazingly|absolutely|totally)\s+\w+\b',
+        r'\b(so|such)\s+(a|an)?\s*\w+\b',
+        r'\bit\s+is\s+(amazing|wonderful|great|fantastic|terrible|awful|beautiful|interesting)\b'
+    ],
+    "present_continuous": [
+        r'\b(am|is|are)\s+\w+ing\b',  # am/is/are + V-ing
+        r'\b(i\'m|he\'s|she\'s|it\'s|we\'re|you\'re|they\'re)\s+\w+ing\b'  # contractions + V-ing
+    ],
+    "past_continuous": [
+        r'\b(was|were)\s+\w+ing\b'  # was/were + V-ing
+    ],
+    "future_continuous": [
+        r'\bwill\s+be\s+\w+ing\b',  # will be + V-ing
+        r'\b(am|is|are)\s+going\s+to\s+be\s+\w+ing\b'  # going to be + V-ing
+    ],
+    "passive_voice_simple": [
+        r'\b(am|is|are|was|were)\s+\w+ed\b',  # be + past participle
+        r'\b(am|is|are|was|were)\s+(made|taken|given|seen|done|written|spoken)\b'
+    ],
+    "passive_voice_perfect": [
+        r'\b(have|has|had)\s+been\s+\w+ed\b',  # have/has/had been + past participle
+        r'\bwill\s+have\s+been\s+\w+ed\b'  # will have been + past participle
+    ],
+    "conditionals_type0": [
+        r'\bif\s+\w+\s+\w+.*,\s*\w+\s+\w+\b',  # if + present simple, present simple
+        r'\bif\s+\w+\s+\w+.*\s+\w+\s+\w+\b'  # if + present simple, present simple (no comma)
+    ],
+    "conditionals_type1": [
+        r'\bif\s+\w+.*,\s*\w+.*will\b',  # if + present, will + infinitive
+        r'\bif\s+\w+.*will\b'
+    ],
+    "conditionals_type2": [
+        r'\bif\s+\w+\s+\w+ed.*would\b',  # if + past simple, would + infinitive
+        r'\bif\s+\w+\s+were.*would\b',  # if + were, would + infinitive
+        r'\bif\s+\w+\s+had.*would\b'  # if + had, would + infinitive
+    ],
+    "conditionals_type3": [
+        r'\bif\s+.*had\s+\w+ed.*would\s+have\b',  # if + past perfect, would have + participle
+        r'\bif\s+.*had\s+.*would\s+have\s+\w+ed\b'
+    ],
+    "modal_verbs_basic": [
+        r'\b(can|could|may|might|must|should|would|will|shall)\s+\w+\b',
+        r'\b(ought\s+to|used\s+to|had\s+better)\s+\w+\b'
+    ],
+    "modal_verbs_advanced": [
+        r'\b(might\s+have|could\s+have|should\s+have|would\s+have|must\s+have)\s+\w+ed\b',
+        r'\b(can\'t\s+have|couldn\'t\s+have|shouldn\'t\s+have)\s+\w+ed\b'
+    ],
+    "relative_clauses_basic": [
+        r'\b(who|which|that|where|when)\s+\w+',  # relative pronouns
+        r'\b(whose|whom)\s+\w+'
+    ],
+    "relative_clauses_advanced": [
+        r'\bthe\s+\w+\s+(who|which|that)\s+\w+',  # the person who/which
+        r'\b\w+,\s+(who|which)\s+\w+',  # non-defining relative clauses
+    ],
+    "question_formation": [
+        r'\b(what|where|when|why|how|who|which)\s+(do|does|did|are|is|was|were|will|would|can|could)\b',
+        r'\b(do|does|did|are|is|was|were|will|would|can|could)\s+\w+\s+\w+\?'
+    ],
+    "gerunds_infinitives": [
+        r'\b(enjoy|love|hate|like|dislike|avoid|finish|stop)\s+\w+ing\b',  # verbs + gerund
+        r'\b(want|need|hope|decide|plan|refuse|agree|promise)\s+to\s+\w+\b',  # verbs + infinitive
+        r'\bit\'s\s+(easy|hard|difficult|important|necessary)\s+to\s+\w+\b'
+    ],
+    "articles": [
+        r'\b(a|an)\s+\w+\b',  # indefinite articles
+        r'\bthe\s+\w+\b',  # definite article
+        r'\b(some|any|many|much|few|little|a\s+lot\s+of)\s+\w+\b'  # quantifiers
+    ],
+    "prepositions_time": [
+        r'\b(in|on|at)\s+(the\s+)?(morning|afternoon|evening|night|weekend)\b',
+        r'\b(in|on|at)\s+\d+\b',  # at 5, in 2021, on Monday
+        r'\b(during|throughout|within|by|until|since|for)\s+\w+\b'
+    ],
+    "prepositions_place": [
+        r'\b(in|on|at|under|over|behind|in\s+front\s+of|next\s+to|between|among)\s+\w+\b',
+        r'\b(here|there|everywhere|somewhere|nowhere|anywhere)\b'
+    ],
+    "future_will": [
+        r'\bwill\s+\w+\b',  # will + infinitive
+        r'\bshall\s+\w+\b'
+    ],
+    "future_going_to": [
+        r'\b(am|is|are)\s+going\s+to\s+\w+\b'  # going to + infinitive
+    ],
+    "basic_comparatives": [
+        r'\b\w+er\s+than\b',  # adjective + er than
+        r'\bmore\s+\w+\s+than\b',  # more + adjective than
+        r'\bthe\s+\w+est\b',  # the + adjective + est
+        r'\bthe\s+most\s+\w+\b',  # the most + adjective
+        r'\b(as\s+\w+\s+as|not\s+as\s+\w+\s+as)\b'  # as...as comparisons
+    ],
+    "superlatives": [
+        r'\bthe\s+(best|worst|most|least)\s+\w+\b',
+        r'\bthe\s+\w+est\s+(in|of|among)\b'
+    ],
+    "past_simple": [
+        r'\b(went|came|saw|did|made|took|gave|got|had|said|told|thought|found|knew|wrote|read|spoke|ate|drank|slept|walked|talked|worked|studied)\b',  # irregular verbs
+        r'\b(was|were)\b',  # be verbs in past
+        r'\b\w+ed\b'  # regular past tense (but be careful with false positives)
+    ],
+    "present_simple": [
+        r'\b(work|works|live|lives|play|plays|eat|eats|speak|speaks|know|knows|study|studies|read|reads|write|writes|listen|listens|watch|watches)\b',  # simple verbs
+        r'\b(do|does)\s+\w+\b',  # do/does + verb
+        r'\b(am|is|are)\s+\w+(?!ing)\b',  # be + not V-ing (but not continuous)
+        r'\bit\s+is\s+\w+\b'  # it is + adjective/noun (like "it is amazing")
+    ]
+}
+
+# Compiled once at import so the detection hot path never re-parses a regex
+# Patterns are lowercase ASCII and run against _fold_case(text), so no IGNORECASE folding per comparison
+_PATTERN_MAP = {
+    pattern_name: tuple(re.compile(regex) for regex in regexes)
+    for pattern_name, regexes in _RAW_PATTERN_MAP.items()
+}
+
+
+# Characters IGNORECASE matches to an ASCII letter but str.lower() doesn't map to it
+# ("İ".lower() is even two characters, which would break \b/\w around it)
+_CASE_FOLD_EXTRAS = str.maketrans({"İ": "i", "ı": "i", "ſ": "s"})
+
+
+def _fold_case(text: str) -> str:
+    """Lowercase text the way re.IGNORECASE compares it against the ASCII patterns"""
+    if text.isascii():
+        return text.lower()
+    return text.translate(_CASE_FOLD_EXTRAS).lower()
+
+
+# One alternation per category: a single scan tells whether ANY of its regexes match
+_FUSED_PATTERNS = {
+    pattern_name: re.compile("|".join(f"(?:{regex})" for regex in regexes))
+    for pattern_name, regexes in _RAW_PATTERN_MAP.items()
+}
+
+# Lowercase substrings of which at least one MUST occur for any regex of the category
+# to match. A cheap `in` check on the lowered text skips categories that can't match.
+_TRIGGERS = {
+    "present_perfect_continuous": ("been",),
+    "present_perfect": ("have", "has"),
+    "past_perfect": ("had",),
+    "time_expressions": (
+        "for", "since", "yesterday", "today", "tomorrow", "now", "then",
+        "already", "just", "yet", "ever", "last", "next", "this"
+    ),
+    "adjective_intensifiers": (
+        "very", "really", "quite", "extremely", "incredibly", "amazingly",
+        "absolutely", "totally", "so", "such", "it"
+    ),
+    "present_continuous": ("ing",),
+    "past_continuous": ("was", "were"),
+    "future_continuous": ("will", "going"),
+    "passive_voice_simple": ("am", "is", "are", "was", "were"),
+    "passive_voice_perfect": ("been",),
+    "conditionals_type0": ("if",),
+    "conditionals_type1": ("if",),
+    "conditionals_type2": ("if",),
+    "conditionals_type3": ("if",),
+    "modal_verbs_basic": (
+        "can", "could", "may", "might", "must", "should", "would", "will",
+        "shall", "ought", "used", "had"
+    ),
+    "modal_verbs_advanced": ("have",),
+    "relative_clauses_basic": ("who", "which", "that", "where", "when"),
+    "relative_clauses_advanced": ("who", "which", "that"),
+    "question_formation": ("what", "where", "when", "why", "how", "who", "which", "?"),
+    "gerunds_infinitives": ("ing", "to"),
+    "articles": ("a", "the", "some", "any", "much", "few", "little"),
+    "prepositions_time": (
+        "in", "on", "at", "during", "throughout", "within", "by", "until", "since", "for"
+    ),
+    "prepositions_place": (
+        "in", "on", "at", "under", "over", "behind", "next", "between", "among", "here"
+    ),
+    "future_will": ("will", "shall"),
+    "future_going_to": ("going",),
+    "basic_comparatives": ("than", "the", "as"),
+    "superlatives": ("the",),
+    "past_simple": (
+        "ed", "was", "were", "went", "came", "saw", "did", "made", "took", "gave", "got",
+        "had", "said", "told", "thought", "found", "knew", "wrote", "read", "spoke",
+        "ate", "drank", "slept"
+    ),
+    "present_simple": (
+        "work", "live", "play", "eat", "speak", "know", "stud", "read", "write",
+        "listen", "watch", "do", "am", "is", "are"
+    )
+}
+
+
+
+def _build_trigger_automaton():
+    """
+    One Aho-Corasick automaton over every trigger keyword, mapping keyword -> categories.
+    A single linear pass over the lowered text then yields all candidate categories.
+    """
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    keyword_categories = {}
+    for pattern_name, triggers in _TRIGGERS.items():
+        for trigger in triggers:
+            keyword_categories.setdefault(trigger, []).append(pattern_name)
+    automaton = ahocorasick.Automaton()
+    for keyword, categories in keyword_categories.items():
+        automaton.add_word(keyword, tuple(categories))
+    automaton.make_automaton()
+    return automaton
+
+
+_TRIGGER_AUTOMATON = _build_trigger_automaton()
+
+
+def _candidate_categories(text_lc: str) -> Set[str]:
+    """Categories with at least one trigger keyword in the (lowercased) text"""
+    if _TRIGGER_AUTOMATON is not None:
+        candidates = set()
+        for _, categories in _TRIGGER_AUTOMATON.iter(text_lc):
+            candidates.update(categories)
+        return candidates
+    return {
+        pattern_name for pattern_name, triggers in _TRIGGERS.items()
+        if any(trigger in text_lc for trigger in triggers)
+    }
+
+# Categories whose individual findall results go through _validate_pattern_match
+_VALIDATED_PATTERNS = frozenset({"present_simple", "past_simple", "present_continuous"})
+
+
+# Detection only looks at the start of the text: patterns are explained from a 1000-char
+# sample anyway, and this keeps the regex scan constant-time for huge pastes
+DETECTION_TEXT_LIMIT = 8000
+MIN_ANALYSIS_TEXT_LENGTH = 10
+
+_SENTENCE_END = re.compile(r'[.!?]["\')\]]*(?=\s)')
+TEXT_SAMPLE_LIMIT = 1000
+
+
+def _sample_text(text: str, limit: int = TEXT_SAMPLE_LIMIT) -> str:
+    """
+    Truncate text for the prompt at the last sentence boundary within the limit
+    Falls back to the last word boundary (with "...") so no word is cut in half
+    """
+    if len(text) <= limit:
+        return text
+    
+    head = text[:limit + 1]  # one extra char so a boundary right at the limit counts
+    last_end = None
+    for last_end in _SENTENCE_END.finditer(head):
+        pass
+    if last_end is not None and last_end.end() <= limit:
+        return text[:last_end.end()]
+    
+    cut = head.rfind(" ", 0, limit + 1)
+    return (text[:cut] if cut > 0 else text[:limit]) + "..."
+
+
+GEMINI_TIMEOUT_SECONDS = 30
+MAX_PATTERNS_PER_PROMPT = 8  # Bounds output length of one batched explanation call
+
+
+class GrammarExplanation(TypedDict):
+    """Response schema Gemini must follow for a single grammar explanation"""
+    pattern_name: str
+    pattern_display_name: str
+    user_level: str
+    example_from_text: str
+    structure_rule: str
+    usage_purpose: str
+    text_analysis: str
+    quiz_question: str
+    hidden_answer: str
+    learning_tip: str
+    difficulty_level: str
+
+
+class GrammarExplanationBatch(TypedDict):
+    """Response schema for several explanations requested in one prompt"""
+    explanations: List[GrammarExplanation]
+
+
+# JSON mode guarantees parseable output (no ```json fences); temperature 0 keeps it deterministic
+EXPLANATION_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=GrammarExplanationBatch,
+    temperature=0
+)
+
+# Static part of every explanation prompt (identical across calls, so it is the model's
+# system instruction instead of being repeated in each request's prompt)
+TEACHER_SYSTEM_INSTRUCTION = """
+You are an expert English teacher helping a Turkish student. Each request gives you the
+STUDENT LEVEL (CEFR A1-C2), the PATTERNS TO EXPLAIN and the TEXT they were detected in.
+
+TASK: Analyze and explain ONLY the listed grammar patterns found in the text for Turkish learners.
+
+CRITICAL INSTRUCTION: 
+- You MUST explain ONLY the listed patterns that were detected
+- Do NOT detect or explain other patterns
+- Focus ONLY on the specific pattern instances found in the text
+- Do NOT confuse with similar patterns
+
+FIRST: PATTERN DETECTION (for EACH listed pattern)
+1. Find ALL instances of the SPECIFIC pattern in the text
+2. Analyze how each instance is used
+3. Note any variations or special cases
+
+THEN PROVIDE DETAILED EXPLANATION (for EACH listed pattern):
+1. PATTERN IDENTIFICATION: List all found instances with their complete sentences
+2. STRUCTURE EXPLANATION: Explain the grammar rule and structure in simple terms
+3. USAGE PURPOSE: Explain when and why this pattern is used
+4. TEXT ANALYSIS: Analyze why this pattern was chosen in each instance
+5. INTERACTIVE QUIZ: Create a translation exercise using a similar pattern (just the English sentence, no "Translate this sentence into Turkish:" prefix)
+6. HIDDEN ANSWER: Provide the correct translation (to be revealed later)
+7. LEARNING TIP: Give a practical tip for remembering this pattern
+
+IMPORTANT:
+- Focus on ACTUAL USAGE in the text
+- Identify ALL instances of each pattern
+- Explain each instance's purpose
+- Explanations should be appropriate for the student level
+- Use Turkish for explanations but keep English examples
+- Make quiz challenging but not too difficult
+- Ensure each quiz sentence uses the same pattern it belongs to
+
+OUTPUT FORMAT (JSON) - one item per pattern, in the order listed:
+{
+    "explanations": [
+        {
+            "pattern_name": "exact pattern key from the list",
+            "pattern_display_name": "Display name in Turkish",
+            "user_level": "the student level",
+            "example_from_text": "ALL sentences from text using this pattern",
+            "structure_rule": "grammar structure explanation in Turkish",
+            "usage_purpose": "when and why to use this pattern (Turkish)",
+            "text_analysis": "analysis of EACH instance in the text (Turkish)",
+            "quiz_question": "English sentence for user to translate",
+            "hidden_answer": "Turkish translation of quiz sentence",
+            "learning_tip": "practical tip for remembering (Turkish)",
+            "difficulty_level": "A1/A2/B1/B2/C1/C2"
+        }
+    ]
+}
+
+RULES:
+- Find and analyze EVERY instance of each pattern
+- Keep explanations clear and concise
+- Use practical examples from the text
+- Make quiz relevant to the pattern
+- Ensure all explanations are in Turkish except English examples
+- Adapt complexity to user level
+- DO NOT explain other patterns, only the listed ones
+- Quiz question should be ONLY the English sentence, no "Translate this sentence into Turkish:" prefix
+"""
+
+# Cache for Gemini explanations, keyed on (pattern, user level, normalized text sample)
+_EXPLANATION_CACHE = TTLCache(maxsize=2048, ttl=86400)
+
 
 class AITeacherService:
     """
@@ -18,11 +405,12 @@ class AITeacherService:
     """
     
     def __init__(self):
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY environment variable is required")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        # Shared process-wide model; configuring the SDK once keeps its connections alive
+        self.model = get_generative_model(
+            'gemini-2.0-flash',
+            system_instruction=TEACHER_SYSTEM_INSTRUCTION,
+            generation_config=EXPLANATION_GENERATION_CONFIG
+        )
         self.grammar_service = GrammarHierarchyService()
     
     async def analyze_text_for_user(self, text: str, user_id: int, db: Session) -> Dict:
@@ -38,37 +426,58 @@ class AITeacherService:
             Dict with personalized analysis and explanations
         """
         try:
-            # 1. Detect grammar patterns in text
-            detected_patterns = self._detect_grammar_patterns(text)
+            # Too short to contain any pattern: skip detection, the unknown-pattern filter and Gemini
+            text = (text or "").strip()
+            if len(text) < MIN_ANALYSIS_TEXT_LENGTH:
+                return {
+                    "success": True,
+                    "message": "Metin çok kısa",
+                    "explanations": [],
+                    "user_level": self.grammar_service.calculate_user_level(user_id, db)
+                }
+            
+            # 1. Detect grammar patterns in text (CPU-bound regex scan, kept off the event loop)
+            detected_patterns = await asyncio.to_thread(self._detect_grammar_patterns, text)
             
             # 2. Filter to unknown patterns only
             unknown_patterns = self.grammar_service.get_unknown_grammar_patterns(
                 user_id, detected_patterns, db
             )
             
+            # User level is loop-invariant: compute once for the response and every explanation
+            user_level_info = self.grammar_service.calculate_user_level(user_id, db)
+            user_level = user_level_info.get("user_level", {}).get("level", "A1")
+            
             if not unknown_patterns:
                 return {
                     "success": True,
                     "message": "Bu metindeki tüm grammar yapılarını zaten biliyorsunuz! 🎉",
                     "explanations": [],
-                    "user_level": self.grammar_service.calculate_user_level(user_id, db)
+                    "user_level": user_level_info
                 }
             
-            # 3. Generate explanations for unknown patterns
-            explanations = []
-            for pattern in unknown_patterns:  # Show ALL unknown patterns, not just first 3
-                explanation = await self._generate_grammar_explanation(
-                    text, pattern, user_id, db
-                )
-                if explanation and explanation.get("success"):
-                    explanations.append(explanation["data"])
+            # 3. Generate explanations for ALL unknown patterns: several patterns per prompt,
+            #    batches run concurrently (independent Gemini calls)
+            batches = [
+                unknown_patterns[i:i + MAX_PATTERNS_PER_PROMPT]
+                for i in range(0, len(unknown_patterns), MAX_PATTERNS_PER_PROMPT)
+            ]
+            batch_results = await asyncio.gather(
+                *[self._generate_grammar_explanations(text, batch, user_level) for batch in batches],
+                return_exceptions=True
+            )
+            explanations = [
+                result["data"]
+                for results in batch_results if isinstance(results, list)
+                for result in results if result.get("success")
+            ]
             
             return {
                 "success": True,
                 "explanations": explanations,
                 "patterns_explained": len(explanations),
                 "total_patterns_detected": len(detected_patterns),
-                "user_level": self.grammar_service.calculate_user_level(user_id, db)
+                "user_level": user_level_info
             }
             
         except Exception as e:
@@ -85,146 +494,34 @@ class AITeacherService:
         """
         patterns_found = []
         
-        # Grammar pattern definitions - ORDER MATTERS! (More specific first)
-        pattern_map = {
-            # Complex patterns first (to avoid false positives)
-            "present_perfect_continuous": [
-                r'\b(have|has)\s+been\s+\w+ing\b',  # have/has been + V-ing
-                r'\b(have|has)\s+been\s+\w+ing\s+(for|since)\b'  # with time expressions
-            ],
-            "present_perfect": [
-                r'\b(have|has)\s+\w+ed\b',  # have/has + past participle
-                r'\b(have|has)\s+(been|gone|done|seen|made|taken|given)\b'  # irregular verbs
-            ],
-            "past_perfect": [
-                r'\bhad\s+\w+ed\b',  # had + past participle
-                r'\bhad\s+(been|gone|done|seen|made|taken|given)\b'
-            ],
-            "time_expressions": [
-                r'\b(for|since)\s+(two|three|four|five|six|seven|eight|nine|ten|\d+)\s+(years?|months?|days?|hours?|minutes?)\b',
-                r'\b(yesterday|today|tomorrow|now|then|already|just|yet|ever|never)\b',
-                r'\b(last|next|this)\s+(year|month|week|day|time)\b'
-            ],
-            "adjective_intensifiers": [
-                r'\b(very|really|quite|extremely|incredibly|amazingly|absolutely|totally)\s+\w+\b',
-                r'\b(so|such)\s+(a|an)?\s*\w+\b',
-                r'\bit\s+is\s+(amazing|wonderful|great|fantastic|terrible|awful|beautiful|interesting)\b'
-            ],
-            "present_continuous": [
-                r'\b(am|is|are)\s+\w+ing\b',  # am/is/are + V-ing
-                r'\b(I\'m|he\'s|she\'s|it\'s|we\'re|you\'re|they\'re)\s+\w+ing\b'  # contractions + V-ing
-            ],
-            "past_continuous": [
-                r'\b(was|were)\s+\w+ing\b'  # was/were + V-ing
-            ],
-            "future_continuous": [
-                r'\bwill\s+be\s+\w+ing\b',  # will be + V-ing
-                r'\b(am|is|are)\s+going\s+to\s+be\s+\w+ing\b'  # going to be + V-ing
-            ],
-            "passive_voice_simple": [
-                r'\b(am|is|are|was|were)\s+\w+ed\b',  # be + past participle
-                r'\b(am|is|are|was|were)\s+(made|taken|given|seen|done|written|spoken)\b'
-            ],
-            "passive_voice_perfect": [
-                r'\b(have|has|had)\s+been\s+\w+ed\b',  # have/has/had been + past participle
-                r'\bwill\s+have\s+been\s+\w+ed\b'  # will have been + past participle
-            ],
-            "conditionals_type0": [
-                r'\bif\s+\w+\s+\w+.*,\s*\w+\s+\w+\b',  # if + present simple, present simple
-                r'\bif\s+\w+\s+\w+.*\s+\w+\s+\w+\b'  # if + present simple, present simple (no comma)
-            ],
-            "conditionals_type1": [
-                r'\bif\s+\w+.*,\s*\w+.*will\b',  # if + present, will + infinitive
-                r'\bif\s+\w+.*will\b'
-            ],
-            "conditionals_type2": [
-                r'\bif\s+\w+\s+\w+ed.*would\b',  # if + past simple, would + infinitive
-                r'\bif\s+\w+\s+were.*would\b',  # if + were, would + infinitive
-                r'\bif\s+\w+\s+had.*would\b'  # if + had, would + infinitive
-            ],
-            "conditionals_type3": [
-                r'\bif\s+.*had\s+\w+ed.*would\s+have\b',  # if + past perfect, would have + participle
-                r'\bif\s+.*had\s+.*would\s+have\s+\w+ed\b'
-            ],
-            "modal_verbs_basic": [
-                r'\b(can|could|may|might|must|should|would|will|shall)\s+\w+\b',
-                r'\b(ought\s+to|used\s+to|had\s+better)\s+\w+\b'
-            ],
-            "modal_verbs_advanced": [
-                r'\b(might\s+have|could\s+have|should\s+have|would\s+have|must\s+have)\s+\w+ed\b',
-                r'\b(can\'t\s+have|couldn\'t\s+have|shouldn\'t\s+have)\s+\w+ed\b'
-            ],
-            "relative_clauses_basic": [
-                r'\b(who|which|that|where|when)\s+\w+',  # relative pronouns
-                r'\b(whose|whom)\s+\w+'
-            ],
-            "relative_clauses_advanced": [
-                r'\bthe\s+\w+\s+(who|which|that)\s+\w+',  # the person who/which
-                r'\b\w+,\s+(who|which)\s+\w+',  # non-defining relative clauses
-            ],
-            "question_formation": [
-                r'\b(what|where|when|why|how|who|which)\s+(do|does|did|are|is|was|were|will|would|can|could)\b',
-                r'\b(do|does|did|are|is|was|were|will|would|can|could)\s+\w+\s+\w+\?'
-            ],
-            "gerunds_infinitives": [
-                r'\b(enjoy|love|hate|like|dislike|avoid|finish|stop)\s+\w+ing\b',  # verbs + gerund
-                r'\b(want|need|hope|decide|plan|refuse|agree|promise)\s+to\s+\w+\b',  # verbs + infinitive
-                r'\bit\'s\s+(easy|hard|difficult|important|necessary)\s+to\s+\w+\b'
-            ],
-            "articles": [
-                r'\b(a|an)\s+\w+\b',  # indefinite articles
-                r'\bthe\s+\w+\b',  # definite article
-                r'\b(some|any|many|much|few|little|a\s+lot\s+of)\s+\w+\b'  # quantifiers
-            ],
-            "prepositions_time": [
-                r'\b(in|on|at)\s+(the\s+)?(morning|afternoon|evening|night|weekend)\b',
-                r'\b(in|on|at)\s+\d+\b',  # at 5, in 2021, on Monday
-                r'\b(during|throughout|within|by|until|since|for)\s+\w+\b'
-            ],
-            "prepositions_place": [
-                r'\b(in|on|at|under|over|behind|in\s+front\s+of|next\s+to|between|among)\s+\w+\b',
-                r'\b(here|there|everywhere|somewhere|nowhere|anywhere)\b'
-            ],
-            "future_will": [
-                r'\bwill\s+\w+\b',  # will + infinitive
-                r'\bshall\s+\w+\b'
-            ],
-            "future_going_to": [
-                r'\b(am|is|are)\s+going\s+to\s+\w+\b'  # going to + infinitive
-            ],
-            "basic_comparatives": [
-                r'\b\w+er\s+than\b',  # adjective + er than
-                r'\bmore\s+\w+\s+than\b',  # more + adjective than
-                r'\bthe\s+\w+est\b',  # the + adjective + est
-                r'\bthe\s+most\s+\w+\b',  # the most + adjective
-                r'\b(as\s+\w+\s+as|not\s+as\s+\w+\s+as)\b'  # as...as comparisons
-            ],
-            "superlatives": [
-                r'\bthe\s+(best|worst|most|least)\s+\w+\b',
-                r'\bthe\s+\w+est\s+(in|of|among)\b'
-            ],
-            "past_simple": [
-                r'\b(went|came|saw|did|made|took|gave|got|had|said|told|thought|found|knew|wrote|read|spoke|ate|drank|slept|walked|talked|worked|studied)\b',  # irregular verbs
-                r'\b(was|were)\b',  # be verbs in past
-                r'\b\w+ed\b'  # regular past tense (but be careful with false positives)
-            ],
-            "present_simple": [
-                r'\b(work|works|live|lives|play|plays|eat|eats|speak|speaks|know|knows|study|studies|read|reads|write|writes|listen|listens|watch|watches)\b',  # simple verbs
-                r'\b(do|does)\s+\w+\b',  # do/does + verb
-                r'\b(am|is|are)\s+\w+(?!ing)\b',  # be + not V-ing (but not continuous)
-                r'\bit\s+is\s+\w+\b'  # it is + adjective/noun (like "it is amazing")
-            ]
-        }
+        # Bound the scan (see DETECTION_TEXT_LIMIT); typical articles are unaffected
+        text = text[:DETECTION_TEXT_LIMIT]
+        
+        # Lowercase once; every pattern below is case-sensitive lowercase
+        text_lc = _fold_case(text)
+        
+        # Keyword prefilter is far cheaper than a regex miss over the whole text
+        candidates = _candidate_categories(text_lc)
         
         # Check each pattern in order (most specific first)
-        for pattern_name, regexes in pattern_map.items():
-            for regex in regexes:
-                matches = re.findall(regex, text, re.IGNORECASE)
+        for pattern_name, fused_regex in _FUSED_PATTERNS.items():
+            if pattern_name not in candidates:
+                continue
+            if not fused_regex.search(text_lc):
+                continue
+            
+            # Any match is enough unless the category needs per-regex validation
+            # (each category is visited once, so no duplicate check is needed)
+            if pattern_name not in _VALIDATED_PATTERNS:
+                patterns_found.append(pattern_name)
+                continue
+            
+            for regex in _PATTERN_MAP[pattern_name]:
+                matches = regex.findall(text_lc)
                 if matches:
                     # Additional validation to reduce false positives
                     if self._validate_pattern_match(pattern_name, matches, text):
-                        if pattern_name not in patterns_found:
-                            patterns_found.append(pattern_name)
+                        patterns_found.append(pattern_name)
                         break
         
         return patterns_found
@@ -259,127 +556,111 @@ class AITeacherService:
         
         return patterns_found
     
-    async def _generate_grammar_explanation(self, text: str, pattern: str, user_id: int, db: Session) -> Dict:
+    async def _generate_grammar_explanations(self, text: str, patterns: List[str], user_level: str) -> List[Dict]:
         """
-        Generate intelligent grammar explanation with interactive quiz
+        Generate intelligent grammar explanations with interactive quizzes for several patterns
+        in ONE Gemini call, so the text sample and instructions are sent once per batch
         
         Args:
-            text: Original text containing the pattern
-            pattern: Grammar pattern to explain
-            user_id: User ID for level adaptation
-            db: Database session
+            text: Original text containing the patterns
+            patterns: Grammar patterns to explain (at most MAX_PATTERNS_PER_PROMPT)
+            user_level: User's CEFR level (A1-C2), computed once by the caller
             
         Returns:
-            Dict with detailed explanation and quiz
+            List of dicts with detailed explanation and quiz, in the same order as patterns
         """
+        # Limit text length for API
+        text_sample = _sample_text(text)
+        normalized_sample = " ".join(text_sample.split())
+        
+        # Key on whitespace-normalized text so re-submissions that only differ in
+        # spacing/line breaks/paragraph boundaries reuse the same explanation
+        cache_keys = {
+            pattern: make_cache_key(pattern=pattern, level=user_level, text=normalized_sample)
+            for pattern in patterns
+        }
+        explanations = {}
+        for pattern in patterns:
+            cached = _EXPLANATION_CACHE.get(cache_keys[pattern])
+            if cached is not None:
+                explanations[pattern] = {"success": True, "data": dict(cached)}
+        
+        missing = [pattern for pattern in patterns if pattern not in explanations]
+        if not missing:
+            return [explanations[pattern] for pattern in patterns]
+        
+        patterns_list = ", ".join(f'"{pattern}"' for pattern in missing)
+        
         try:
-            # Get user level for adaptation
-            user_level_info = self.grammar_service.calculate_user_level(user_id, db)
-            user_level = user_level_info.get("user_level", {}).get("level", "A1")
-            
-            # Limit text length for API
-            text_sample = text[:1000] + "..." if len(text) > 1000 else text
-            
+            # Only the variable part is sent per call; the static instructions
+            # live in TEACHER_SYSTEM_INSTRUCTION
             prompt = f"""
-You are an expert English teacher helping a {user_level} level Turkish student.
+STUDENT LEVEL: {user_level}
 
-TASK: Analyze and explain ONLY the grammar pattern "{pattern}" found in this text for Turkish learners.
+PATTERNS TO EXPLAIN (in this order): {patterns_list}
 
 TEXT: "{text_sample}"
-
-CRITICAL INSTRUCTION: 
-- You MUST explain ONLY the pattern "{pattern}" that was detected
-- Do NOT detect or explain other patterns
-- Focus ONLY on the specific pattern instances found in the text
-- Do NOT confuse with similar patterns
-
-FIRST: PATTERN DETECTION
-1. Find ALL instances of the SPECIFIC pattern "{pattern}" in the text
-2. Analyze how each instance is used
-3. Note any variations or special cases
-
-THEN PROVIDE DETAILED EXPLANATION:
-1. PATTERN IDENTIFICATION: List all found instances with their complete sentences
-2. STRUCTURE EXPLANATION: Explain the grammar rule and structure in simple terms
-3. USAGE PURPOSE: Explain when and why this pattern is used
-4. TEXT ANALYSIS: Analyze why this pattern was chosen in each instance
-5. INTERACTIVE QUIZ: Create a translation exercise using a similar pattern (just the English sentence, no "Translate this sentence into Turkish:" prefix)
-6. HIDDEN ANSWER: Provide the correct translation (to be revealed later)
-7. LEARNING TIP: Give a practical tip for remembering this pattern
-
-IMPORTANT:
-- Focus on ACTUAL USAGE in the text
-- Identify ALL instances of the pattern
-- Explain each instance's purpose
-- Explanations should be appropriate for {user_level} level
-- Use Turkish for explanations but keep English examples
-- Make quiz challenging but not too difficult
-- Ensure quiz sentence uses the same pattern
-
-OUTPUT FORMAT (JSON):
-{{
-    "pattern_name": "{pattern}",
-    "pattern_display_name": "Display name in Turkish",
-    "user_level": "{user_level}",
-    "example_from_text": "ALL sentences from text using this pattern",
-    "structure_rule": "grammar structure explanation in Turkish",
-    "usage_purpose": "when and why to use this pattern (Turkish)",
-    "text_analysis": "analysis of EACH instance in the text (Turkish)",
-    "quiz_question": "English sentence for user to translate",
-    "hidden_answer": "Turkish translation of quiz sentence",
-    "learning_tip": "practical tip for remembering (Turkish)",
-    "difficulty_level": "A1/A2/B1/B2/C1/C2"
-}}
-
-RULES:
-- Find and analyze EVERY instance of the pattern
-- Keep explanations clear and concise
-- Use practical examples from the text
-- Make quiz relevant to the pattern
-- Ensure all explanations are in Turkish except English examples
-- Adapt complexity to user level
-- DO NOT explain other patterns, only "{pattern}"
-- Quiz question should be ONLY the English sentence, no "Translate this sentence into Turkish:" prefix
 """
             
-            response = self.model.generate_content(prompt)
+            # Hard cap so a hung stream can't hold the request open
+            response_text = await asyncio.wait_for(
+                self._stream_response_text(prompt), timeout=GEMINI_TIMEOUT_SECONDS
+            )
             
-            if not response or not response.text:
+            if not response_text:
                 raise Exception("Empty response from AI")
             
-            # Clean response and parse JSON
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:]
-            if response_text.endswith('```'):
-                response_text = response_text[:-3]
+            # JSON mode: the response body is the JSON document itself
+            items = from_json(response_text).get("explanations", [])
+            results_by_pattern = {item.get("pattern_name"): item for item in items if isinstance(item, dict)}
             
-            result = json.loads(response_text)
-            
-            return {
-                "success": True,
-                "data": {
-                    "pattern_name": result.get("pattern_name", pattern),
-                    "pattern_display_name": result.get("pattern_display_name", pattern),
-                    "user_level": result.get("user_level", user_level),
-                    "example_from_text": result.get("example_from_text", ""),
-                    "structure_rule": result.get("structure_rule", ""),
-                    "usage_purpose": result.get("usage_purpose", ""),
-                    "text_analysis": result.get("text_analysis", ""),
-                    "quiz_question": result.get("quiz_question", ""),
-                    "hidden_answer": result.get("hidden_answer", ""),
-                    "learning_tip": result.get("learning_tip", ""),
-                    "difficulty_level": self.grammar_service.get_pattern_difficulty_level(pattern)  # ✅ USE HIERARCHY!
+            for pattern in missing:
+                result = results_by_pattern.get(pattern)
+                if result is None:
+                    logger.error("No explanation returned for pattern %s", pattern)
+                    explanations[pattern] = self._fallback_explanation(pattern, user_level, text)
+                    continue
+                
+                explanation = {
+                    "success": True,
+                    "data": {
+                        "pattern_name": pattern,
+                        "pattern_display_name": result.get("pattern_display_name", pattern),
+                        "user_level": result.get("user_level", user_level),
+                        "example_from_text": result.get("example_from_text", ""),
+                        "structure_rule": result.get("structure_rule", ""),
+                        "usage_purpose": result.get("usage_purpose", ""),
+                        "text_analysis": result.get("text_analysis", ""),
+                        "quiz_question": result.get("quiz_question", ""),
+                        "hidden_answer": result.get("hidden_answer", ""),
+                        "learning_tip": result.get("learning_tip", ""),
+                        "difficulty_level": self.grammar_service.get_pattern_difficulty_level(pattern)  # ✅ USE HIERARCHY!
+                    }
                 }
-            }
+                _EXPLANATION_CACHE.set(cache_keys[pattern], explanation["data"])
+                explanations[pattern] = explanation
             
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error for pattern {pattern}: {str(e)}")
-            return self._fallback_explanation(pattern, user_level, text)
+        except ValueError as e:
+            logger.error("JSON parsing error for patterns %s: %s", missing, e)
             
         except Exception as e:
-            logger.error(f"Error generating explanation for pattern {pattern}: {str(e)}")
-            return self._fallback_explanation(pattern, user_level, text)
+            logger.error("Error generating explanations for patterns %s: %s", missing, e)
+        
+        return [
+            explanations.get(pattern) or self._fallback_explanation(pattern, user_level, text)
+            for pattern in patterns
+        ]
+    
+    async def _stream_response_text(self, prompt: str) -> str:
+        """
+        Stream a Gemini response and return the joined text.
+        Chunks are consumed on the event loop, so concurrent explanations share one thread.
+        """
+        response = await self.model.generate_content_async(prompt, stream=True)
+        chunks = []
+        async for chunk in response:
+            chunks.append(chunk.text)
+        return "".join(chunks).strip()
     
     def _fallback_explanation(self, pattern: str, user_level: str, text: str) -> Dict:
         """
@@ -402,6 +683,10 @@ RULES:
             }
         }
     
+    def get_explanation_cache_stats(self) -> Dict:
+        """Hit/miss statistics of the explanation cache"""
+        return _EXPLANATION_CACHE.stats()
+    
     async def mark_user_grammar_knowledge(self, user_id: int, pattern: str, status: str, db: Session) -> Dict:
         """
         Mark user's grammar knowledge status
@@ -1,16 +1,318 @@
-import os
 import google.generativeai as genai
-from typing import List, Dict, Set
+from app.services.gemini_client import get_generative_model
+from app.services.gemini_batch import JsonObjectScanner, get_batch_processor
+from typing import AsyncIterator, List, Dict, Optional, Set, Tuple, TypedDict
+from pydantic import BaseModel
+from pydantic_core import from_json
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.models.user_vocabulary import User, UserVocabulary, Vocabulary
-from app.models.user_vocabulary import UserGrammarKnowledge
+from app.models.user_vocabulary import User
 from app.services.grammar_hierarchy_service import GrammarHierarchyService
+from app.core.cache import TTLCache, make_cache_key
+import hashlib
 import logging
-import json
+import asyncio
+import re
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
+# Adapt to the "+" band between the user's level and the next one (optimal learning)
+_ADAPTATION_TARGET_LEVEL = {
+    "A1": "A1+",  # A1 ile A2 arası
+    "A2": "A2+",  # A2 ile B1 arası
+    "B1": "B1+",  # B1 ile B2 arası
+    "B2": "B2+",  # B2 ile C1 arası
+    "C1": "C1+",  # C1 ile C2 arası
+    "C2": "C2"    # C2'den sonra C2 kalır
+}
+
+# Adapted chunks keyed by (chunk text, current level, target level). The adaptation
+# prompt depends on nothing else, so users at the same level share one Gemini call
+# (YouTube transcripts are identical per video, so repeated videos hit this too)
+ADAPTATION_CACHE = TTLCache(maxsize=1024, ttl=7 * 24 * 3600)
+
+# Word explanations and grammar analyses don't depend on the user either; only parsed
+# (non-fallback) responses are stored
+EXPLANATION_CACHE = TTLCache(maxsize=1024, ttl=7 * 24 * 3600)
+GRAMMAR_ANALYSIS_CACHE = TTLCache(maxsize=256, ttl=24 * 3600)
+
+
+class CEFRResult(BaseModel):
+    """Gemini's CEFR analysis; parsed and validated in pydantic-core, missing fields get defaults"""
+    cefr_level: str = "B1"
+    confidence: int = 50
+    analysis: str = "AI analysis completed"
+    vocabulary_level: str = "B1"
+    grammar_level: str = "B1"
+    sentence_complexity: str = "B1"
+    key_indicators: List[str] = []
+    word_count_estimate: Optional[int] = None
+
+
+# Parsed CEFR detection responses keyed by the normalized analyzed sample, shared by all
+# service instances. Texts up to CEFR_SAMPLE_LENGTH characters are sent whole; longer ones as
+# beginning + middle + end segments of CEFR_SAMPLE_SEGMENT characters (same token cost, but a
+# preface or table of contents doesn't stand in for the whole text)
+CEFR_SAMPLE_LENGTH = 1000
+CEFR_SAMPLE_SEGMENT = 300
+# Texts shorter than this get the local heuristic without a Gemini call when the caller
+# allows a fallback; callers that need an AI level (allow_fallback=False) still send them
+CEFR_HEURISTIC_MAX_CHARS = 200
+CEFR_TOO_SHORT_ERROR = "Text too short for CEFR detection"
+CEFR_DETECTION_CACHE = TTLCache(maxsize=4096, ttl=24 * 3600)
+# Unparseable responses are cached briefly under the same key (negative caching)
+CEFR_FAILURE_TTL = 60
+CEFR_PARSE_ERROR = "Failed to parse AI response"
+_CEFR_PARSE_FAILED = object()
+
+# CEFR rubric and response shape shared by the single- and multi-text detection prompts
+_CEFR_CRITERIA = """ANALYSIS CRITERIA:
+📚 VOCABULARY COMPLEXITY:
+- A1: Basic everyday words (300-600 words)
+- A2: Common words, simple descriptions (600-1200 words) 
+- B1: More varied vocabulary, some abstract concepts (1200-2500 words)
+- B2: Wide vocabulary range, specialized terms (2500-3250 words)
+- C1: Advanced vocabulary, nuanced expressions (3250-5000 words)
+- C2: Very advanced, sophisticated language (5000+ words)
+
+🔤 GRAMMAR COMPLEXITY:
+- A1: Present simple, basic sentence structures
+- A2: Past simple, future, basic comparatives
+- B1: Present perfect, conditional, complex sentences
+- B2: Passive voice, reported speech, advanced tenses
+- C1: Complex grammar, sophisticated structures
+- C2: Near-native grammar mastery
+
+📝 SENTENCE STRUCTURE:
+- A1-A2: Simple, short sentences
+- B1-B2: Compound and some complex sentences  
+- C1-C2: Complex, sophisticated sentence structures"""
+
+class CEFRAnalysis(TypedDict):
+    """Response schema Gemini must follow for one CEFR analysis"""
+    cefr_level: str
+    confidence: int
+    analysis: str
+    vocabulary_level: str
+    grammar_level: str
+    sentence_complexity: str
+    key_indicators: List[str]
+    word_count_estimate: int
+
+
+class CEFRGroupAnalysis(CEFRAnalysis):
+    """One entry of a multi-text response; index is the text number"""
+    index: int
+
+
+class CEFRGroupAnalysisBatch(TypedDict):
+    """Response schema for several texts analyzed in one prompt"""
+    results: List[CEFRGroupAnalysis]
+
+
+# JSON mode guarantees parseable, schema-shaped output (no ```json fences, no example JSON in the prompt)
+CEFR_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=CEFRAnalysis
+)
+CEFR_GROUP_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=CEFRGroupAnalysisBatch
+)
+
+# Static CEFR rubric, set once as the detection model's system instruction; per-call
+# prompts only carry the text(s) to analyze
+CEFR_SYSTEM_INSTRUCTION = f"""You are an expert in CEFR level analysis of English texts.
+Each request gives one English text, or several numbered texts, to analyze.
+
+{_CEFR_CRITERIA}
+
+For each text give the overall cefr_level (A1-C2), a confidence of 0-100, a short analysis,
+separate vocabulary/grammar/sentence complexity levels, the key indicators you relied on and
+an estimated word count.
+
+For numbered texts, analyze each one independently and set "index" to the text number."""
+
+# Per-call CEFR prompts (rubric is in CEFR_SYSTEM_INSTRUCTION)
+_CEFR_PROMPT_TEMPLATE = 'TEXT TO ANALYZE:\n"{sample}"'
+_CEFR_GROUP_PROMPT_TEMPLATE = "TEXTS TO ANALYZE ({count}):\n{numbered}"
+_CEFR_GROUP_ITEM_TEMPLATE = 'TEXT {number}: "{sample}"'
+
+# Texts analyzed per multi-text CEFR prompt (rubric is sent once per group)
+CEFR_TEXTS_PER_PROMPT = 8
+
+# Local pre-filter: texts whose lexical statistics are unambiguous skip the Gemini call.
+# Thresholds are deliberately strict; everything in between goes to the model.
+FAST_CEFR_MIN_WORDS = 40
+_FAST_CEFR_RULES = (
+    # (level, confidence, predicate(avg word length, avg sentence length, long-word ratio))
+    ("A1", 90, lambda wlen, slen, long_ratio: wlen < 4.2 and slen < 9 and long_ratio < 0.03),
+    ("C1", 85, lambda wlen, slen, long_ratio: wlen > 5.5 and slen > 20 and long_ratio > 0.2),
+)
+
+EXPLAINED_WORDS_LIMIT = 10
+
+_EXPLANATION_TEMPLATE = """As a language learning tutor, provide simple, clear explanations for these English words in Turkish (Türkçe).
+
+Words to explain: {words}  # Limit to 10 words
+
+For each word, provide:
+1. Turkish translation
+2. Simple example sentence in English
+3. Turkish explanation of the example
+
+Format as JSON:
+{{
+  "word1": {{
+    "translation": "Turkish translation",
+    "example": "Simple English example sentence",
+    "example_explanation": "Turkish explanation of the example"
+  }},
+  "word2": {{ ... }}
+}}
+
+Keep explanations simple and beginner-friendly."""
+
+# CEFR Level Descriptions
+_LEVEL_DESCRIPTIONS = {
+    "A1": "Very basic vocabulary (family, shopping, food), present tense, simple sentences",
+    "A2": "Common everyday vocabulary, past/future tenses, basic connecting words",
+    "B1": "Work/study vocabulary, conditional sentences, expressing opinions",
+    "B2": "Abstract topics, complex sentences, passive voice, reported speech",
+    "C1": "Specialized vocabulary, advanced grammar, nuanced expression",
+    "C2": "Near-native vocabulary, all grammar structures, sophisticated style"
+}
+
+# Explanations are keyed by the words themselves, so only JSON mode (no fixed schema) applies
+EXPLANATION_GENERATION_CONFIG = genai.GenerationConfig(response_mime_type="application/json")
+
+
+class GrammarPatternItem(TypedDict):
+    pattern: str
+    explanation: str
+    examples: List[str]
+    rules: List[str]
+    difficulty: str
+
+
+class KeyGrammarPoint(TypedDict):
+    point: str
+    description: str
+    examples: List[str]
+    learning_tip: str
+
+
+class VocabularyGrammarConnection(TypedDict):
+    word: str
+    grammar_usage: str
+    examples: List[str]
+
+
+class GrammarAnalysis(TypedDict):
+    """Response schema Gemini must follow for analyze_grammar"""
+    grammar_patterns: List[GrammarPatternItem]
+    key_grammar_points: List[KeyGrammarPoint]
+    vocabulary_grammar_connection: List[VocabularyGrammarConnection]
+    learning_recommendations: List[str]
+    summary: str
+
+
+GRAMMAR_ANALYSIS_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=GrammarAnalysis
+)
+
+# Comprehensive grammar analysis prompt (JSON braces are doubled for format_map)
+_GRAMMAR_ANALYSIS_TEMPLATE = """You are an expert English grammar teacher. Analyze the following text and provide comprehensive grammar insights.
+
+TEXT TO ANALYZE:
+{text}
+
+Please provide a detailed grammar analysis in the following JSON format:
+
+{{
+    "grammar_patterns": [
+        {{
+            "pattern": "Present Perfect Tense",
+            "explanation": "Used for actions that started in the past and continue to the present",
+            "examples": ["I have lived here for 5 years", "She has been working since morning"],
+            "rules": ["Subject + have/has + past participle", "Often used with 'for' and 'since'"],
+            "difficulty": "Intermediate"
+        }}
+    ],
+    "key_grammar_points": [
+        {{
+            "point": "Conditional Sentences",
+            "description": "If-clauses and their different types",
+            "examples": ["If it rains, I will stay home", "If I had money, I would travel"],
+            "learning_tip": "Remember: Type 1 = real possibility, Type 2 = unreal present"
+        }}
+    ],
+    "vocabulary_grammar_connection": [
+        {{
+            "word": "example_word",
+            "grammar_usage": "How this word is used grammatically",
+            "examples": ["Example sentences"]
+        }}
+    ],
+    "learning_recommendations": [
+        "Focus on present perfect vs simple past",
+        "Practice conditional sentences",
+        "Review article usage (a/an/the)"
+    ],
+    "summary": "Brief summary of main grammar points found in the text"
+}}
+
+IMPORTANT:
+- Focus on practical, commonly used grammar patterns
+- Provide clear, simple explanations
+- Include multiple examples for each pattern
+- Identify both basic and advanced grammar structures
+- Give actionable learning tips
+- Keep explanations beginner-friendly but comprehensive
+
+Analyze the text and return the JSON response:"""
+
+# Static CEFR adaptation guidance, sent once as the adaptation model's system instruction;
+# each request only carries the levels and the text
+ADAPTATION_SYSTEM_INSTRUCTION = """You are an expert English teacher specializing in CEFR-based text adaptation.
+Each request gives the student's Current Level, the Target Level (one step above current), the Target Level's requirements and the TEXT.
+
+TASK: Rewrite the text at exactly the Target Level.
+
+RULES:
+1. Use vocabulary and grammar structures typical of the Target Level only - not above, not below
+2. Match the complexity expected at the Target Level
+3. Keep the exact same meaning and information; add nothing
+4. Write naturally
+5. Do not explain what you are doing
+
+Level guide: A1-A2 simple words, present/past tense, short sentences; B1-B2 wider vocabulary, various tenses, longer connected sentences; C1-C2 advanced vocabulary and grammar, complex sentences.
+
+Write ONLY the adapted text."""
+
+ADAPTATION_GENERATION_CONFIG = genai.GenerationConfig(temperature=0.2)
+
+# Output cap per call: ~4 characters per token and the rewrite may be up to 2x the source,
+# bounded by the model's output limit
+ADAPTATION_MAX_OUTPUT_TOKENS = 8192
+MIN_ADAPTATION_OUTPUT_TOKENS = 256
+
+# Long texts (YouTube transcripts) are split at paragraph, then sentence boundaries and the chunks
+# are adapted concurrently: decode time is per call, so N parallel chunks finish ~N times sooner
+ADAPTATION_CHUNK_CHARS = 4000
+_PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])\s+")
+
+_CEFR_ADAPT_TEMPLATE = (
+    "Current Level: {current_level}\n"
+    "Target Level: {target_level}\n"
+    "{target_level} requirements: {level_description}\n\n"
+    "TEXT:\n"
+    "\"{text}\""
+)
+
 class AITextAdaptationService:
     """
     AI-Powered Text Adaptation using Google Gemini
@@ -23,254 +325,39 @@ class AITextAdaptationService:
     """
     
     def __init__(self):
-        # Get Gemini API key from environment variables
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY environment variable is required")
-        genai.configure(api_key=api_key)
-        self.client = genai.GenerativeModel('gemini-1.5-flash')
+        # Shared process-wide model (SDK configured once in gemini_client)
+        self.client = get_generative_model('gemini-1.5-flash')
+        # Same model with the static adaptation guidance as system instruction
+        self.adaptation_model = get_generative_model(
+            'gemini-1.5-flash',
+            system_instruction=ADAPTATION_SYSTEM_INSTRUCTION,
+            generation_config=ADAPTATION_GENERATION_CONFIG
+        )
+        # CEFR detection model: rubric lives in the system instruction
+        self.cefr_model = get_generative_model(
+            'gemini-1.5-flash',
+            system_instruction=CEFR_SYSTEM_INSTRUCTION,
+            generation_config=CEFR_GENERATION_CONFIG
+        )
         self.grammar_service = GrammarHierarchyService()
         self.demo_mode = False  # default off
     
-    @staticmethod
-    def get_user_known_words(username: str, db: Session) -> Set[str]:
-        """Get all words that user knows from database."""
-        try:
-            user = db.query(User).filter(User.username == username).first()
-            if not user:
-                return set()
-            
-            # Get words marked as "known" by user
-            known_words = db.query(UserVocabulary, Vocabulary).join(
-                Vocabulary, UserVocabulary.vocabulary_id == Vocabulary.id
-            ).filter(
-                UserVocabulary.user_id == user.id,
-                UserVocabulary.status.in_(["known", "ignored"])  # Include ignored words as known
-            ).all()
-            
-            words_set = set()
-            for user_vocab, vocab in known_words:
-                word = vocab.word.lower().strip()
-                words_set.add(word)
-                
-                # ✅ GELIŞMIŞ KELIME ÇEŞİTLEME SİSTEMİ
-                # "to + verb" formatından kök kelimeyi al
-                if word.startswith('to ') and len(word) > 3:
-                    base_verb = word[3:]  # "to speak" -> "speak"
-                    words_set.add(base_verb)
-                    
-                    # Kök fiilden tüm çekimleri oluştur
-                    AITextAdaptationService._add_word_variations_static(words_set, base_verb)
-                else:
-                    # Normal kelimeler için çekimleri oluştur
-                    AITextAdaptationService._add_word_variations_static(words_set, word)
-                
-            logging.info(f"Found {len(words_set)} known words for user {username}")
-            return words_set
-            
-        except Exception as e:
-            logging.error(f"Error getting user vocabulary: {e}")
-            return set()
-    
-    def get_user_grammar_knowledge(self, username: str, db: Session) -> Dict:
-        """Get user's grammar knowledge and calculate appropriate level."""
-        try:
-            user = db.query(User).filter(User.username == username).first()
-            if not user:
-                return {"known_patterns": [], "user_level": "A1", "avoid_patterns": []}
-            
-            # Get user's known grammar patterns
-            known_grammar = db.query(UserGrammarKnowledge).filter(
-                UserGrammarKnowledge.user_id == user.id,
-                UserGrammarKnowledge.status == "known"
-            ).all()
-            
-            known_patterns = [g.grammar_pattern for g in known_grammar]
-            
-            # Calculate user level based on combined vocabulary + grammar
-            user_level_info = self.grammar_service.calculate_user_level(user.id, db)
-            user_level = user_level_info.get("user_level", {}).get("level", "A1")
-            
-            # Debug log
-            logging.info(f"User level calculation for {username}: {user_level_info}")
-            logging.info(f"Extracted user level: {user_level}")
-            
-            # Get vocabulary count for level estimation
-            vocab_count = db.query(UserVocabulary).filter(
-                UserVocabulary.user_id == user.id,
-                UserVocabulary.status == "known"
-            ).count()
-            
-            # If user has no grammar patterns but significant vocabulary, 
-            # estimate grammar based on vocabulary level (more reliable)
-            if not known_patterns and vocab_count > 1000:
-                if vocab_count >= 4000:  # B2+ level vocabulary
-                    user_level = "B2"  # Override if vocabulary suggests higher level
-                    known_patterns = [
-                        "present_simple", "past_simple", "future_simple", "present_continuous",
-                        "basic_questions", "simple_conditionals", "basic_comparatives", 
-                        "modal_verbs", "basic_passive", "present_perfect_simple",
-                        "past_continuous", "relative_clauses_basic", "reported_speech_basic"
-                    ]
-                elif vocab_count >= 2000:  # B1 level vocabulary
-                    user_level = "B1"
-                    known_patterns = [
-                        "present_simple", "past_simple", "future_simple", "present_continuous",
-                        "basic_questions", "simple_conditionals", "basic_comparatives", "modal_verbs"
-                    ]
-                elif vocab_count >= 1000:  # A2 level vocabulary
-                    user_level = "A2"
-                    known_patterns = ["present_simple", "past_simple", "future_simple", "basic_questions"]
-                
-                logging.info(f"Overrode user level to {user_level} based on vocabulary: {vocab_count} words")
-            
-            # Determine patterns to avoid (higher than user's level)
-            all_patterns = []
-            for level, patterns in self.grammar_service.GRAMMAR_HIERARCHY.items():
-                all_patterns.extend(patterns)
-            
-            # Avoid patterns that are 2+ levels above user
-            level_order = ["A1", "A2", "B1", "B2", "C1", "C2"]
-            current_index = level_order.index(user_level) if user_level in level_order else 0
-            avoid_patterns = []
-            
-            for level, patterns in self.grammar_service.GRAMMAR_HIERARCHY.items():
-                level_index = level_order.index(level) if level in level_order else 0
-                if level_index > current_index + 1:  # More than 1 level above
-                    avoid_patterns.extend(patterns)
-            
-            return {
-                "known_patterns": known_patterns,
-                "user_level": user_level,
-                "avoid_patterns": avoid_patterns
-            }
-            
-        except Exception as e:
-            logging.error(f"Error getting user grammar knowledge: {e}")
-            return {"known_patterns": [], "user_level": "A1", "avoid_patterns": []}
-    
-    def create_adaptation_prompt(self, text: str, known_words: Set[str], grammar_info: Dict, target_unknown_percentage: float = 5.0) -> str:
-        """
-        Create a sophisticated prompt for Gemini to adapt text to user's current level (i level).
-        Focuses on making text fully comprehensible using only known vocabulary and grammar.
-        """
-        known_words_sample = list(known_words)[:100] if len(known_words) > 100 else list(known_words)
-        known_patterns = grammar_info.get("known_patterns", [])
-        user_level = grammar_info.get("user_level", "A1")
-        avoid_patterns = grammar_info.get("avoid_patterns", [])
-        
-        prompt = f"""You are an expert English teacher adapting text to the student's CURRENT LEVEL for maximum comprehension.
-
-CRITICAL MISSION: Adapt this text to be FULLY COMPREHENSIBLE (95-100%) for this specific student using only their known vocabulary and grammar.
-
-STUDENT PROFILE:
-- Current Level: {user_level}
-- Known Words: {', '.join(known_words_sample)}
-- Known Grammar: {', '.join(known_patterns[:20])}
-- STRICTLY AVOID these patterns: {', '.join(avoid_patterns[:15])}
-
-ORIGINAL TEXT:
-{text}
-
-ADAPTATION RULES (CURRENT LEVEL - i APPROACH):
-1. **VOCABULARY TARGET**: Use 95-100% words from student's known vocabulary ONLY
-2. **GRAMMAR TARGET**: Use ONLY grammar patterns the student already knows
-3. **PRESERVE MEANING**: Keep the EXACT same information and message
-4. **SENTENCE LENGTH**: Keep sentences short and clear (maximum 12 words per sentence)
-5. **STRICT AVOIDANCE**: NEVER use unknown grammar patterns or vocabulary
-
-VOCABULARY STRATEGY:
-- ONLY use words from student's known vocabulary list
-- If a concept requires unknown words, explain with multiple known words
-- Replace ALL unknown words with simpler alternatives from their vocabulary
-- Example: "enormous" → "very big" (if student knows "very" and "big")
-
-GRAMMAR STRATEGY:
-- ONLY use grammar patterns from the known list
-- If student knows only "present_simple": Use only "I work", "He works", etc.
-- If student knows only "past_simple": Use only "I worked", "He went", etc.
-- NO complex grammar - keep it at their current level
-
-STRICTLY FORBIDDEN:
-- Unknown vocabulary (not in their known words list)
-- Unknown grammar patterns (from avoid list)
-- Complex sentence structures beyond their level
-
-CURRENT LEVEL EXAMPLES:
-Complex: "The sophisticated algorithm analyzes comprehensive data sets to determine optimal solutions."
-→ Current Level: "The smart computer program looks at information to find good answers."
-
-Complex: "Having completed the arduous journey, they finally reached their destination."
-→ Current Level: "They finished the hard trip. Now they are at their place."
-
-TARGET OUTPUT FORMAT:
-- Use ONLY vocabulary and grammar from student's current level
-- Write clear, simple sentences (max 12 words each)
-- Maintain original meaning completely
-- Ensure 95-100% comprehensibility for current level
-- Natural English flow within level constraints
-
-IMPORTANT: Write ONLY the adapted English text. No explanations or comments."""
-
-        return prompt
-    
     def create_cefr_adaptation_prompt(self, text: str, current_level: str, target_level: str) -> str:
         """
         🎯 NEW CEFR-BASED ADAPTATION PROMPT
         
         Creates a prompt that adapts text to a specific CEFR level.
         This replaces the old vocabulary-percentage system.
+        Only the per-request part; the static rules are the adaptation model's system instruction.
         """
-        
-        # CEFR Level Descriptions
-        level_descriptions = {
-            "A1": "Very basic vocabulary (family, shopping, food), present tense, simple sentences",
-            "A2": "Common everyday vocabulary, past/future tenses, basic connecting words",
-            "B1": "Work/study vocabulary, conditional sentences, expressing opinions",
-            "B2": "Abstract topics, complex sentences, passive voice, reported speech",
-            "C1": "Specialized vocabulary, advanced grammar, nuanced expression",
-            "C2": "Near-native vocabulary, all grammar structures, sophisticated style"
-        }
-        
-        prompt = f"""You are an expert English language teacher specializing in CEFR-based text adaptation.
-
-🎯 TASK: Rewrite the following text EXACTLY at {target_level} CEFR level.
-
-📊 USER CONTEXT:
-- Current Level: {current_level}
-- Target Level: {target_level} (one level above current)
-
-📋 {target_level} LEVEL REQUIREMENTS:
-{level_descriptions.get(target_level, "Standard level")}
-
-🔑 ADAPTATION RULES:
-
-1. **VOCABULARY**: Use vocabulary appropriate for {target_level} level only
-2. **GRAMMAR**: Use grammar structures typical of {target_level} level
-3. **COMPLEXITY**: Match the complexity expected at {target_level} level
-4. **MEANING**: Keep the exact same meaning and information
-5. **NATURAL FLOW**: Write naturally - don't make it sound artificial
-
-📝 LEVEL-SPECIFIC GUIDELINES:
-
-A1-A2: Very simple words, present/past tense, short sentences
-B1-B2: More complex vocabulary, various tenses, longer connected sentences  
-C1-C2: Advanced vocabulary, sophisticated grammar, complex sentence structures
-
-❌ FORBIDDEN:
-- Do NOT explain what you're doing
-- Do NOT add extra information
-- Do NOT use vocabulary/grammar above {target_level} level
-- Do NOT use vocabulary/grammar below {target_level} level
-
-🎯 TARGET TEXT TO ADAPT:
-"{text}"
-
-✍️ ADAPTED TEXT (write ONLY the adapted text, nothing else):"""
-
-        return prompt
+        return _CEFR_ADAPT_TEMPLATE.format_map({
+            "current_level": current_level,
+            "target_level": target_level,
+            "level_description": _LEVEL_DESCRIPTIONS.get(target_level, "Standard level"),
+            "text": text
+        })
     
-    def adapt_text_with_ai(self, text: str, username: str, db: Session, target_unknown_percentage: float = 0.0) -> Dict:
+    async def adapt_text_with_ai(self, text: str, username: str, db: Session, target_unknown_percentage: float = 0.0) -> Dict:
         """
         🎯 CEFR LEVEL-BASED ADAPTATION (Current Level System)
         
@@ -289,42 +376,36 @@ C1-C2: Advanced vocabulary, sophisticated grammar, complex sentence structures
             if not user:
                 return {"error": f"User '{username}' not found"}
             
-            # Get user's CEFR level instead of vocabulary
-            user_level_info = self.grammar_service.calculate_user_level(user.id, db)
-            
-            # Extract user's current CEFR level
-            current_level = user_level_info.get("user_level", {}).get("level", "A1")
-            
-            # Use B1+ level (optimal learning - between current and next level)
-            level_mapping = {
-                "A1": "A1+",  # A1 ile A2 arası
-                "A2": "A2+",  # A2 ile B1 arası
-                "B1": "B1+",  # B1 ile B2 arası
-                "B2": "B2+",  # B2 ile C1 arası
-                "C1": "C1+",  # C1 ile C2 arası
-                "C2": "C2"    # C2'den sonra C2 kalır
-            }
-            target_level = level_mapping.get(current_level, "B1+")
-            
-            # Create the NEW CEFR-based adaptation prompt
-            prompt = self.create_cefr_adaptation_prompt(text, current_level, target_level)
+            current_level, target_level = self._get_adaptation_levels(user.id, db)
             
-            # Call Google Gemini
+            # Call Google Gemini (chunks are cached individually, see _adapt_chunk)
             try:
-                response = self.client.generate_content(prompt)
-                adapted_text = response.text.strip()
+                pieces = self._split_for_adaptation(text)
+                results = await asyncio.gather(
+                    *(self._adapt_chunk(chunk, current_level, target_level) for _, chunk in pieces),
+                    return_exceptions=True
+                )
+                errors = [result for result in results if isinstance(result, Exception)]
+                if len(errors) == len(results):
+                    raise errors[0]
+                for error in errors:
+                    logger.error("Gemini API error on one adaptation chunk: %s", error)
                 
-                # Clean up any formatting artifacts
-                adapted_text = adapted_text.replace('```', '').strip()
-                if adapted_text.startswith('"') and adapted_text.endswith('"'):
-                    adapted_text = adapted_text[1:-1]
+                # Rejoin in order with the original separators (paragraph breaks are kept); a chunk
+                # whose adaptation failed or came back empty keeps its original text
+                adapted_text = "".join(
+                    separator + (result if isinstance(result, str) and result else chunk)
+                    for (separator, chunk), result in zip(pieces, results)
+                ).strip()
+                unadapted = sum(1 for result in results if not isinstance(result, str) or not result)
                 
                 # Generate adaptation statistics
                 adaptation_info = {
                     "user_current_level": current_level,
                     "target_level": target_level,
                     "adaptation_strategy": f"CEFR Level-Based: {current_level} → {target_level} (B1+ Optimal Learning)",
-                    "method": "B1+ Optimal Adaptation"
+                    "method": "B1+ Optimal Adaptation",
+                    "unadapted_chunks": unadapted
                 }
                 
                 return {
@@ -338,7 +419,7 @@ C1-C2: Advanced vocabulary, sophisticated grammar, complex sentence structures
                 }
                 
             except Exception as api_error:
-                logging.error(f"Gemini API error: {str(api_error)}")
+                logger.error("Gemini API error: %s", api_error)
                 return {
                     "error": f"AI adaptation failed: {str(api_error)}",
                     "original_text": text,
@@ -346,13 +427,163 @@ C1-C2: Advanced vocabulary, sophisticated grammar, complex sentence structures
                 }
                 
         except Exception as e:
-            logging.error(f"Adaptation service error: {str(e)}")
+            logger.error("Adaptation service error: %s", e)
             return {
                 "error": f"Adaptation failed: {str(e)}",
                 "original_text": text,
                 "adapted_text": text
             }
     
+    async def _adapt_chunk(self, text: str, current_level: str, target_level: str) -> str:
+        """
+        Adapt one chunk with the CEFR prompt and clean up formatting artifacts
+        Cached per chunk, so an edited or partially repeated transcript only re-adapts changed chunks
+        """
+        cache_key = make_cache_key(text=text, current_level=current_level, target_level=target_level)
+        adapted_text = ADAPTATION_CACHE.get(cache_key)
+        if adapted_text is not None:
+            return adapted_text
+        
+        prompt = self.create_cefr_adaptation_prompt(text, current_level, target_level)
+        adapted_text = await self._generate_text_async(
+            prompt,
+            model=self.adaptation_model,
+            generation_config=self._adaptation_generation_config(text)
+        )
+        
+        # Clean up any formatting artifacts
+        adapted_text = adapted_text.replace('```', '').strip()
+        if adapted_text.startswith('"') and adapted_text.endswith('"'):
+            adapted_text = adapted_text[1:-1]
+        
+        if adapted_text:
+            ADAPTATION_CACHE.set(cache_key, adapted_text)
+        return adapted_text
+    
+    @staticmethod
+    def _split_for_adaptation(text: str) -> List[Tuple[str, str]]:
+        """
+        Split text into (separator, chunk) pieces of about ADAPTATION_CHUNK_CHARS
+        Short paragraphs are packed together; a paragraph is only broken between sentences when
+        it exceeds the limit on its own. The separator goes before the adapted chunk on rejoin.
+        """
+        if len(text) <= ADAPTATION_CHUNK_CHARS:
+            return [("", text)]
+        pieces, current, size = [], [], 0
+        for paragraph in _PARAGRAPH_BREAK_RE.split(text.strip()):
+            if current and size + len(paragraph) > ADAPTATION_CHUNK_CHARS:
+                pieces.append(("\n\n", "\n\n".join(current)))
+                current, size = [], 0
+            if len(paragraph) <= ADAPTATION_CHUNK_CHARS:
+                current.append(paragraph)
+                size += len(paragraph) + 2
+                continue
+            first, *rest = AITextAdaptationService._split_sentences(paragraph)
+            pieces.append(("\n\n", first))
+            pieces.extend((" ", chunk) for chunk in rest)
+        if current:
+            pieces.append(("\n\n", "\n\n".join(current)))
+        return pieces
+    
+    @staticmethod
+    def _split_sentences(text: str) -> List[str]:
+        """Split one paragraph into chunks of about ADAPTATION_CHUNK_CHARS, breaking only between sentences"""
+        chunks, current, size = [], [], 0
+        for sentence in _SENTENCE_BREAK_RE.split(text):
+            if current and size + len(sentence) > ADAPTATION_CHUNK_CHARS:
+                chunks.append(" ".join(current))
+                current, size = [], 0
+            current.append(sentence)
+            size += len(sentence) + 1
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+    
+    def _get_adaptation_levels(self, user_id: int, db: Session) -> Tuple[str, str]:
+        """Return (user's current CEFR level, adaptation target level)"""
+        # Get user's CEFR level instead of vocabulary (stored on the user row while fresh)
+        current_level = self.grammar_service.get_current_level(user_id, db)
+        return current_level, _ADAPTATION_TARGET_LEVEL.get(current_level, "B1+")
+    
+    async def adapt_text_stream(self, text: str, username: str, db: Session) -> AsyncIterator[str]:
+        """
+        Streaming variant of adapt_text_with_ai: yields the adapted text chunk by chunk, in order,
+        as each _adapt_chunk call finishes (same rate-limited queue and per-chunk cache).
+        A later chunk whose adaptation fails or comes back empty is sent as its original text;
+        the response is already under way by then, so those chunks are counted in a warning log.
+        
+        Raises:
+            ValueError: If the user doesn't exist
+            Exception: Whatever Gemini raised for the first chunk (nothing has been sent yet)
+        """
+        user = db.query(User).filter(User.username == username).first()
+        if not user:
+            raise ValueError(f"User '{username}' not found")
+        
+        current_level, target_level = self._get_adaptation_levels(user.id, db)
+        pieces = self._split_for_adaptation(text)
+        # All chunks are submitted at once; the shared Gemini call limiter bounds concurrency and rate
+        tasks = [
+            asyncio.ensure_future(self._adapt_chunk(chunk, current_level, target_level))
+            for _, chunk in pieces
+        ]
+        unadapted = 0
+        try:
+            for number, ((separator, chunk), task) in enumerate(zip(pieces, tasks)):
+                try:
+                    adapted_text = await task
+                except Exception as e:
+                    if number == 0:
+                        raise
+                    logger.error("Gemini API error on one adaptation chunk: %s", e)
+                    adapted_text = ""
+                if not adapted_text:
+                    unadapted += 1
+                yield (separator if number else "") + (adapted_text or chunk)
+            if unadapted:
+                logger.warning(
+                    "Streamed adaptation for %s sent %d of %d chunks unadapted",
+                    username, unadapted, len(pieces)
+                )
+        finally:
+            # Client went away or the first chunk failed: drop the chunks still queued
+            for task in tasks:
+                task.cancel()
+    
+    def _generate_text(self, prompt: str, model=None, stop_at_json: bool = False) -> str:
+        """
+        Call Gemini with streaming and return the joined, stripped text.
+        Chunks are consumed as they arrive instead of waiting for one complete response.
+        stop_at_json: stop reading once the first JSON object has closed
+        """
+        response = (model or self.client).generate_content(prompt, stream=True)
+        chunks = []
+        scanner = JsonObjectScanner() if stop_at_json else None
+        for chunk in response:
+            chunks.append(chunk.text)
+            if scanner is not None and scanner.feed(chunk.text):
+                break
+        return "".join(chunks).strip()
+    
+    async def _generate_text_async(
+        self,
+        prompt: str,
+        model=None,
+        generation_config: Optional[Dict] = None,
+        stop_at_json: bool = False
+    ) -> str:
+        """
+        Async streaming variant of _generate_text; the event loop is free while Gemini generates.
+        Goes through the shared Gemini call limiter (concurrency + rate limited, retried).
+        """
+        return await get_batch_processor(model or self.client).submit(prompt, generation_config, stop_at_json)
+    
+    @staticmethod
+    def _adaptation_generation_config(text: str) -> Dict:
+        """Per-call output cap sized to the source text (decode time grows with max_output_tokens)"""
+        max_tokens = min(ADAPTATION_MAX_OUTPUT_TOKENS, max(MIN_ADAPTATION_OUTPUT_TOKENS, len(text) // 2))
+        return {"max_output_tokens": max_tokens}
+    
     def _demo_adaptation(self, text: str, known_words: Set[str], target_unknown_percentage: float) -> str:
         """
         Demo mode adaptation using AI for simple text simplification.
@@ -367,16 +598,15 @@ C1-C2: Advanced vocabulary, sophisticated grammar, complex sentence structures
             
             Return only the simplified text, nothing else."""
             
-            response = self.client.generate_content(prompt)
-            adapted_text = response.text.strip()
+            adapted_text = self._generate_text(prompt)
             return adapted_text
             
         except Exception as e:
-            logging.error(f"Demo adaptation failed: {e}")
+            logger.error("Demo adaptation failed: %s", e)
             # Fallback: return original text with note
             return f"{text}\n\n[Note: This is a simplified version for learning]"
     
-    def adapt_youtube_with_ai(self, youtube_url: str, username: str, db: Session, target_unknown_percentage: float = 10.0) -> Dict:
+    async def adapt_youtube_with_ai(self, youtube_url: str, username: str, db: Session, target_unknown_percentage: float = 10.0) -> Dict:
         """
         Complete AI-powered YouTube adaptation pipeline.
         """
@@ -390,14 +620,15 @@ C1-C2: Advanced vocabulary, sophisticated grammar, complex sentence structures
             if not video_id:
                 return {"error": "Invalid YouTube URL"}
             
-            transcript_result = youtube_service.get_transcript(video_id)
+            # Transcript download is blocking network I/O
+            transcript_result = await asyncio.to_thread(youtube_service.get_transcript, video_id)
             if not transcript_result.get("success"):
                 return {"error": f"Transcript not found: {transcript_result.get('error', 'Unknown error')}"}
             
             transcript = transcript_result["transcript"]
             
             # Adapt transcript with AI using NEW CEFR system
-            adaptation_result = self.adapt_text_with_ai(transcript, username, db, target_unknown_percentage)
+            adaptation_result = await self.adapt_text_with_ai(transcript, username, db, target_unknown_percentage)
             
             # Add video metadata
             adaptation_result.update({
@@ -410,10 +641,10 @@ C1-C2: Advanced vocabulary, sophisticated grammar, complex sentence structures
             return adaptation_result
             
         except Exception as e:
-            logging.error(f"Error in YouTube AI adaptation: {e}")
+            logger.error("Error in YouTube AI adaptation: %s", e)
             return {"error": f"YouTube adaptation failed: {str(e)}"}
     
-    def generate_learning_explanation(self, unknown_words: List[str], username: str) -> Dict:
+    async def generate_learning_explanation(self, unknown_words: List[str], username: str) -> Dict:
         """
         Generate AI-powered explanations for unknown words in user's native language.
         """
@@ -421,35 +652,10 @@ C1-C2: Advanced vocabulary, sophisticated grammar, complex sentence structures
             return {"explanations": {}}
         
         try:
-            # Clean words for better AI processing
-            cleaned_words = [word.lower().strip() for word in unknown_words]
-            
-            # For Turkish users, provide explanations in Turkish
-            prompt = f"""As a language learning tutor, provide simple, clear explanations for these English words in Turkish (Türkçe).
-
-Words to explain: {', '.join(cleaned_words[:10])}  # Limit to 10 words
-
-For each word, provide:
-1. Turkish translation
-2. Simple example sentence in English
-3. Turkish explanation of the example
-
-Format as JSON:
-{{
-  "word1": {{
-    "translation": "Turkish translation",
-    "example": "Simple English example sentence",
-    "example_explanation": "Turkish explanation of the example"
-  }},
-  "word2": {{ ... }}
-}}
-
-Keep explanations simple and beginner-friendly."""
-
             if self.demo_mode:
                 # Demo mode: provide simple explanations
                 explanations = {}
-                for word in unknown_words[:10]:
+                for word in unknown_words[:EXPLAINED_WORDS_LIMIT]:
                     explanations[word] = {
                         "translation": f"{word} kelimesinin Türkçe karşılığı",
                         "example": f"This is an example sentence with {word}.",
@@ -461,19 +667,32 @@ Keep explanations simple and beginner-friendly."""
                     "explained_words": len(explanations)
                 }
             
-            # Real OpenAI API call
-            response = self.client.generate_content(prompt)
-            explanations_text = response.text.strip()
+            # Clean words for better AI processing (only the ones that go into the prompt)
+            cleaned_words = [word.lower().strip() for word in islice(unknown_words, EXPLAINED_WORDS_LIMIT)]
+            
+            cache_key = make_cache_key(explain_words=sorted(cleaned_words))
+            explanations = EXPLANATION_CACHE.get(cache_key)
+            if explanations is not None:
+                return {
+                    "explanations": explanations,
+                    "total_words": len(unknown_words),
+                    "explained_words": len(explanations)
+                }
+            
+            # For Turkish users, provide explanations in Turkish
+            prompt = _EXPLANATION_TEMPLATE.format_map({"words": ", ".join(cleaned_words)})
             
-            # Clean JSON text (remove markdown formatting if present)
-            if explanations_text.startswith('```json'):
-                explanations_text = explanations_text.replace('```json', '').replace('```', '').strip()
+            # JSON mode: the response is the bare JSON object (no markdown fences)
+            explanations_text = await self._generate_text_async(
+                prompt, generation_config=EXPLANATION_GENERATION_CONFIG
+            )
             
             try:
-                explanations = json.loads(explanations_text)
-            except json.JSONDecodeError:
+                explanations = from_json(explanations_text)
+                EXPLANATION_CACHE.set(cache_key, explanations)
+            except ValueError:
                 # Fallback if JSON parsing fails
-                logging.error(f"Failed to parse JSON: {explanations_text}")
+                logger.error("Failed to parse JSON: %s", explanations_text)
                 explanations = {
                     unknown_words[0]: {
                         "translation": "Parsing error - çeviri alınamadı",
@@ -489,83 +708,38 @@ Keep explanations simple and beginner-friendly."""
             }
             
         except Exception as e:
-            logging.error(f"Error generating explanations: {e}")
+            logger.error("Error generating explanations: %s", e)
             return {
                 "error": f"Failed to generate explanations: {str(e)}",
                 "explanations": {}
             }
     
-    def analyze_grammar(self, text: str, username: str) -> Dict:
+    async def analyze_grammar(self, text: str, username: str) -> Dict:
         """
         🔍 Grammar Analysis: Analyze text and provide comprehensive grammar learning insights.
         Identifies grammar patterns, explains rules with examples, and provides learning tips.
         """
         try:
-            # Create comprehensive grammar analysis prompt
-            prompt = f"""You are an expert English grammar teacher. Analyze the following text and provide comprehensive grammar insights.
-
-TEXT TO ANALYZE:
-{text}
-
-Please provide a detailed grammar analysis in the following JSON format:
-
-{{
-    "grammar_patterns": [
-        {{
-            "pattern": "Present Perfect Tense",
-            "explanation": "Used for actions that started in the past and continue to the present",
-            "examples": ["I have lived here for 5 years", "She has been working since morning"],
-            "rules": ["Subject + have/has + past participle", "Often used with 'for' and 'since'"],
-            "difficulty": "Intermediate"
-        }}
-    ],
-    "key_grammar_points": [
-        {{
-            "point": "Conditional Sentences",
-            "description": "If-clauses and their different types",
-            "examples": ["If it rains, I will stay home", "If I had money, I would travel"],
-            "learning_tip": "Remember: Type 1 = real possibility, Type 2 = unreal present"
-        }}
-    ],
-    "vocabulary_grammar_connection": [
-        {{
-            "word": "example_word",
-            "grammar_usage": "How this word is used grammatically",
-            "examples": ["Example sentences"]
-        }}
-    ],
-    "learning_recommendations": [
-        "Focus on present perfect vs simple past",
-        "Practice conditional sentences",
-        "Review article usage (a/an/the)"
-    ],
-    "summary": "Brief summary of main grammar points found in the text"
-}}
-
-IMPORTANT:
-- Focus on practical, commonly used grammar patterns
-- Provide clear, simple explanations
-- Include multiple examples for each pattern
-- Identify both basic and advanced grammar structures
-- Give actionable learning tips
-- Keep explanations beginner-friendly but comprehensive
-
-Analyze the text and return the JSON response:"""
+            cache_key = make_cache_key(grammar_text=text)
+            grammar_analysis = GRAMMAR_ANALYSIS_CACHE.get(cache_key)
+            if grammar_analysis is not None:
+                return self._grammar_analysis_result(grammar_analysis, text)
+            
+            prompt = _GRAMMAR_ANALYSIS_TEMPLATE.format_map({"text": text})
 
             # Call Gemini API
             try:
-                response = self.client.generate_content(prompt)
-                grammar_analysis_text = response.text.strip()
-                
-                # Clean JSON text (remove markdown formatting if present)
-                if grammar_analysis_text.startswith('```json'):
-                    grammar_analysis_text = grammar_analysis_text.replace('```json', '').replace('```', '').strip()
+                # Structured output: JSON matching GrammarAnalysis, no fences to strip
+                grammar_analysis_text = await self._generate_text_async(
+                    prompt, generation_config=GRAMMAR_ANALYSIS_GENERATION_CONFIG
+                )
                 
                 try:
-                    grammar_analysis = json.loads(grammar_analysis_text)
-                except json.JSONDecodeError:
+                    grammar_analysis = from_json(grammar_analysis_text)
+                    GRAMMAR_ANALYSIS_CACHE.set(cache_key, grammar_analysis)
+                except ValueError:
                     # Fallback if JSON parsing fails
-                    logging.error(f"Failed to parse grammar analysis JSON: {grammar_analysis_text}")
+                    logger.error("Failed to parse grammar analysis JSON: %s", grammar_analysis_text)
                     grammar_analysis = {
                         "grammar_patterns": [
                             {
@@ -593,221 +767,293 @@ Analyze the text and return the JSON response:"""
                         "summary": "Basic grammar analysis - focus on sentence structure and verb forms"
                     }
                 
-                return {
-                    "grammar_analysis": grammar_analysis,
-                    "original_text": text,
-                    "analysis_type": "comprehensive_grammar",
-                    "total_patterns": len(grammar_analysis.get("grammar_patterns", [])),
-                    "learning_points": len(grammar_analysis.get("key_grammar_points", []))
-                }
+                return self._grammar_analysis_result(grammar_analysis, text)
                 
             except Exception as e:
-                logging.error(f"Error calling Gemini API for grammar analysis: {e}")
+                logger.error("Error calling Gemini API for grammar analysis: %s", e)
                 return {
                     "error": f"Failed to analyze grammar: {str(e)}",
                     "grammar_analysis": {}
                 }
                 
         except Exception as e:
-            logging.error(f"Error in grammar analysis: {e}")
+            logger.error("Error in grammar analysis: %s", e)
             return {
                 "error": f"Grammar analysis failed: {str(e)}",
                 "grammar_analysis": {}
             }
     
     @staticmethod
-    def _add_word_variations_static(words_set: Set[str], word: str):
-        """
-        Static version of word variations for use in static methods.
+    def _grammar_analysis_result(grammar_analysis: Dict, text: str) -> Dict:
+        """Build the analyze_grammar response from the parsed analysis"""
+        return {
+            "grammar_analysis": grammar_analysis,
+            "original_text": text,
+            "analysis_type": "comprehensive_grammar",
+            "total_patterns": len(grammar_analysis.get("grammar_patterns", [])),
+            "learning_points": len(grammar_analysis.get("key_grammar_points", []))
+        }
+    
+    def detect_cefr_level(self, text: str, allow_fallback: bool = False) -> Dict[str, any]:
         """
-        if not word or len(word) < 2:
-            return
-            
-        # Orijinal kelimeyi ekle
-        words_set.add(word)
+        🎯 CEFR LEVEL DETECTION using AI
         
-        # Basit çekim kuralları - sadece temel formlar
+        Analyzes text and determines CEFR level (A1-C2) with confidence score.
+        Returns detailed analysis for library filtering.
+        """
+        tokens = None
         try:
-            # -ing formu
-            if word.endswith('e') and len(word) > 2:
-                words_set.add(word[:-1] + 'ing')  # use -> using
-            else:
-                words_set.add(word + 'ing')  # work -> working
+            # One split shared by the pre-filter, the word-count fallback and the heuristic
+            tokens = text.split()
+            local_result = self._local_cefr(text, tokens, allow_fallback)
+            if local_result is not None:
+                return local_result
             
-            # -ed formu  
-            if word.endswith('e') and len(word) > 2:
-                words_set.add(word + 'd')  # use -> used
-            else:
-                words_set.add(word + 'ed')  # work -> worked
+            # The cache key and the prompt are built from the same sample
+            sample = self._cefr_sample(text)
+            cache_key = self._cefr_cache_key(sample)
+            cached = self._cached_cefr(cache_key, text, tokens, allow_fallback)
+            if cached is not None:
+                return cached
             
-            # -s/-es formu
-            if word.endswith(('s', 'sh', 'ch', 'x', 'z')) or word.endswith('o'):
-                words_set.add(word + 'es')  # go -> goes
-            elif word.endswith('y') and len(word) > 2:
-                words_set.add(word[:-1] + 'ies')  # try -> tries
-            else:
-                words_set.add(word + 's')  # work -> works
+            result_text = self._generate_text(self._cefr_prompt(sample), model=self.cefr_model, stop_at_json=True)
+            return self._parse_cefr_response(result_text, text, tokens, cache_key, allow_fallback)
                 
         except Exception as e:
-            # Hata durumunda sadece orijinal kelimeyi ekle
-            logging.warning(f"Error in word variations for '{word}': {e}")
-            pass
-
-    def _add_word_variations(self, words_set: Set[str], word: str):
-        """
-        Kelimeye ait tüm çekimli hallerini words_set'e ekler.
-        Basitleştirilmiş ve performans odaklı versiyon.
-        """
-        if not word or len(word) < 2:
-            return
-            
-        # Orijinal kelimeyi ekle
-        words_set.add(word)
-        
-        # Basit çekim kuralları - sadece temel formlar
+            logger.error("Error in CEFR level detection: %s", e)
+            return self._cefr_failure(text, str(e), allow_fallback, tokens)
+    
+    async def detect_cefr_level_async(self, text: str, allow_fallback: bool = False) -> Dict[str, any]:
+        """Async variant of detect_cefr_level; the Gemini call goes through the shared batching queue"""
+        tokens = None
         try:
-            # -ing formu
-            if word.endswith('e') and len(word) > 2:
-                words_set.add(word[:-1] + 'ing')  # use -> using
-            else:
-                words_set.add(word + 'ing')  # work -> working
+            # One split shared by the pre-filter, the word-count fallback and the heuristic
+            tokens = text.split()
+            local_result = self._local_cefr(text, tokens, allow_fallback)
+            if local_result is not None:
+                return local_result
             
-            # -ed formu  
-            if word.endswith('e') and len(word) > 2:
-                words_set.add(word + 'd')  # use -> used
-            else:
-                words_set.add(word + 'ed')  # work -> worked
+            # The cache key and the prompt are built from the same sample
+            sample = self._cefr_sample(text)
+            cache_key = self._cefr_cache_key(sample)
+            cached = self._cached_cefr(cache_key, text, tokens, allow_fallback)
+            if cached is not None:
+                return cached
             
-            # -s/-es formu
-            if word.endswith(('s', 'sh', 'ch', 'x', 'z')) or word.endswith('o'):
-                words_set.add(word + 'es')  # go -> goes
-            elif word.endswith('y') and len(word) > 2:
-                words_set.add(word[:-1] + 'ies')  # try -> tries
-            else:
-                words_set.add(word + 's')  # work -> works
+            result_text = await self._generate_text_async(self._cefr_prompt(sample), model=self.cefr_model, stop_at_json=True)
+            return self._parse_cefr_response(result_text, text, tokens, cache_key, allow_fallback)
                 
         except Exception as e:
-            # Hata durumunda sadece orijinal kelimeyi ekle
-            logging.warning(f"Error in word variations for '{word}': {e}")
-            pass 
-    def detect_cefr_level(self, text: str, allow_fallback: bool = False) -> Dict[str, any]:
+            logger.error("Error in CEFR level detection: %s", e)
+            return self._cefr_failure(text, str(e), allow_fallback, tokens)
+    
+    async def detect_cefr_level_batch(self, texts: List[str], allow_fallback: bool = False) -> List[Dict]:
         """
-        🎯 CEFR LEVEL DETECTION using AI
+        Detect CEFR levels for many texts; results are in input order.
+        Uncached texts are sent CEFR_TEXTS_PER_PROMPT at a time in one multi-text prompt, and the
+        groups run concurrently (bounded by the shared Gemini batching queue). Texts a group
+        response doesn't cover go through detect_cefr_level_async individually.
+        A failing item yields an error result instead of failing the whole batch.
+        """
+        results: List[Optional[Dict]] = [None] * len(texts)
+        pending = []  # (index, cache_key, sample) of texts that need Gemini
+        for index, text in enumerate(texts):
+            try:
+                tokens = text.split()
+                local_result = self._local_cefr(text, tokens, allow_fallback)
+                if local_result is not None:
+                    results[index] = local_result
+                    continue
+                sample = self._cefr_sample(text)
+                cache_key = self._cefr_cache_key(sample)
+            except Exception as e:
+                results[index] = {"success": False, "error": str(e), "cefr_level": None}
+                continue
+            cached = self._cached_cefr(cache_key, text, tokens, allow_fallback)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append((index, cache_key, sample))
         
-        Analyzes text and determines CEFR level (A1-C2) with confidence score.
-        Returns detailed analysis for library filtering.
+        groups = [pending[i:i + CEFR_TEXTS_PER_PROMPT] for i in range(0, len(pending), CEFR_TEXTS_PER_PROMPT)]
+        await asyncio.gather(*(
+            self._detect_cefr_group(texts, group, results) for group in groups if len(group) > 1
+        ))
+        
+        leftovers = [index for index, result in enumerate(results) if result is None]
+        singles = await asyncio.gather(
+            *(self.detect_cefr_level_async(texts[index], allow_fallback=allow_fallback) for index in leftovers),
+            return_exceptions=True
+        )
+        for index, result in zip(leftovers, singles):
+            results[index] = (
+                {"success": False, "error": str(result), "cefr_level": None}
+                if isinstance(result, Exception) else result
+            )
+        return results
+    
+    async def _detect_cefr_group(
+        self, texts: List[str], group: List[Tuple[int, bytes, str]], results: List[Optional[Dict]]
+    ) -> None:
+        """One Gemini call for several texts; fills results for every text the response covers"""
+        numbered = "\n".join(
+            _CEFR_GROUP_ITEM_TEMPLATE.format_map({"number": number, "sample": sample})
+            for number, (_, _, sample) in enumerate(group, start=1)
+        )
+        prompt = _CEFR_GROUP_PROMPT_TEMPLATE.format_map({"count": len(group), "numbered": numbered})
+        try:
+            result_text = await self._generate_text_async(
+                prompt, model=self.cefr_model, generation_config=CEFR_GROUP_GENERATION_CONFIG, stop_at_json=True
+            )
+            for item in from_json(result_text).get("results", []):
+                number = item.get("index") if isinstance(item, dict) else None
+                if not isinstance(number, int) or not 1 <= number <= len(group) or not item.get("cefr_level"):
+                    continue
+                try:
+                    analysis_result = CEFRResult.model_validate(item)
+                except ValueError:
+                    continue
+                index, cache_key, _ = group[number - 1]
+                results[index] = self._cefr_result(analysis_result, texts[index].split())
+                CEFR_DETECTION_CACHE.set(cache_key, analysis_result)
+        except Exception as e:
+            # Uncovered texts fall back to one call each
+            logger.error("Error in multi-text CEFR detection: %s", e)
+    
+    @staticmethod
+    def _cefr_cache_key(sample: str) -> bytes:
+        """
+        Key on the (whitespace-normalized) sample sent to Gemini, casefolded, so re-submissions
+        that only differ in spacing, line breaks or capitalization reuse the same detection
+        The sample is encoded once and hashed directly (no JSON envelope as in make_cache_key)
+        """
+        return hashlib.sha256(sample.casefold().encode("utf-8")).digest()
+    
+    @staticmethod
+    def _cefr_prompt(sample: str) -> str:
+        """CEFR analysis prompt for a sample from _cefr_sample"""
+        return _CEFR_PROMPT_TEMPLATE.format_map({"sample": sample})
+    
+    @staticmethod
+    def _cefr_sample(text: str) -> str:
         """
+        Whitespace-normalized text: whole up to CEFR_SAMPLE_LENGTH, else its beginning, middle
+        and end joined by '...'. Both the prompt and the cache key are built from this string.
+        """
+        text = " ".join(text.split())
+        if len(text) <= CEFR_SAMPLE_LENGTH:
+            return text
+        middle = (len(text) - CEFR_SAMPLE_SEGMENT) // 2
+        return " ... ".join((
+            text[:CEFR_SAMPLE_SEGMENT],
+            text[middle:middle + CEFR_SAMPLE_SEGMENT],
+            text[-CEFR_SAMPLE_SEGMENT:]
+        ))
+    
+    def _parse_cefr_response(
+        self, result_text: str, text: str, tokens: List[str], cache_key: bytes, allow_fallback: bool
+    ) -> Dict[str, any]:
+        """Parse Gemini's CEFR JSON (JSON mode, so no fences); successful results are cached"""
+        # Parse + validate JSON response (pydantic's ValidationError is a ValueError)
         try:
-            prompt = f"""
-🎯 CEFR LEVEL ANALYSIS TASK
-
-Analyze the following English text and determine its CEFR level.
-
-ANALYSIS CRITERIA:
-📚 VOCABULARY COMPLEXITY:
-- A1: Basic everyday words (300-600 words)
-- A2: Common words, simple descriptions (600-1200 words) 
-- B1: More varied vocabulary, some abstract concepts (1200-2500 words)
-- B2: Wide vocabulary range, specialized terms (2500-3250 words)
-- C1: Advanced vocabulary, nuanced expressions (3250-5000 words)
-- C2: Very advanced, sophisticated language (5000+ words)
-
-🔤 GRAMMAR COMPLEXITY:
-- A1: Present simple, basic sentence structures
-- A2: Past simple, future, basic comparatives
-- B1: Present perfect, conditional, complex sentences
-- B2: Passive voice, reported speech, advanced tenses
-- C1: Complex grammar, sophisticated structures
-- C2: Near-native grammar mastery
-
-📝 SENTENCE STRUCTURE:
-- A1-A2: Simple, short sentences
-- B1-B2: Compound and some complex sentences  
-- C1-C2: Complex, sophisticated sentence structures
-
-🎯 TEXT TO ANALYZE:
-"{text[:1000]}..." 
-
-PROVIDE YOUR ANALYSIS IN THIS EXACT JSON FORMAT:
-{{
-    "cefr_level": "B1",
-    "confidence": 85,
-    "analysis": "This text demonstrates B1 level complexity with present perfect tense, conditional structures, and vocabulary around 1500 words. Sentence structures are moderately complex with some subordinate clauses.",
-    "vocabulary_level": "B1",
-    "grammar_level": "B1", 
-    "sentence_complexity": "B1",
-    "key_indicators": [
-        "Present perfect tense usage",
-        "Conditional sentences", 
-        "Moderate vocabulary complexity",
-        "Some complex sentence structures"
-    ],
-    "word_count_estimate": 1500
-}}
+            analysis_result = CEFRResult.model_validate_json(result_text)
+            result = self._cefr_result(analysis_result, tokens)
+            CEFR_DETECTION_CACHE.set(cache_key, analysis_result)
+            return result
+        except ValueError as e:
+            logger.error("JSON parsing error in CEFR detection: %s", e)
+            # Short-lived negative entry: identical texts don't re-hit Gemini during a model hiccup
+            CEFR_DETECTION_CACHE.set(cache_key, _CEFR_PARSE_FAILED, ttl=CEFR_FAILURE_TTL)
+            return self._cefr_failure(text, CEFR_PARSE_ERROR, allow_fallback, tokens)
+    
+    def _cached_cefr(
+        self, cache_key: bytes, text: str, tokens: List[str], allow_fallback: bool
+    ) -> Optional[Dict[str, any]]:
+        """Result for a cached detection (or a recent parse failure), None on a cache miss"""
+        analysis_result = CEFR_DETECTION_CACHE.get(cache_key)
+        if analysis_result is None:
+            return None
+        if analysis_result is _CEFR_PARSE_FAILED:
+            return self._cefr_failure(text, CEFR_PARSE_ERROR, allow_fallback, tokens)
+        return self._cefr_result(analysis_result, tokens)
+    
+    def _cefr_failure(
+        self, text: str, error: str, allow_fallback: bool, tokens: Optional[List[str]] = None
+    ) -> Dict[str, any]:
+        """Heuristic result when fallback is allowed, otherwise an error result"""
+        if allow_fallback:
+            heur = self._heuristic_cefr(text, tokens)
+            return {
+                "success": True,
+                "cefr_level": heur["cefr_level"],
+                "confidence": heur["confidence"],
+                "analysis": heur["analysis"],
+                "vocabulary_level": heur["cefr_level"],
+                "grammar_level": heur["cefr_level"],
+                "sentence_complexity": heur["cefr_level"],
+                "key_indicators": heur["key_indicators"],
+                "word_count_estimate": heur["word_count_estimate"],
+            }
+        return {"success": False, "error": error, "cefr_level": None}
 
-RESPOND ONLY WITH THE JSON, NO OTHER TEXT."""
+    @staticmethod
+    def _cefr_result(analysis_result: CEFRResult, tokens: List[str]) -> Dict[str, any]:
+        """Build the detect_cefr_level response from the parsed model output (tokens = text.split())"""
+        result = {"success": True, **analysis_result.model_dump()}
+        if result["word_count_estimate"] is None:
+            result["word_count_estimate"] = len(tokens)
+        return result
 
-            response = self.client.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Clean up response
-            if result_text.startswith('```json'):
-                result_text = result_text[7:]
-            if result_text.endswith('```'):
-                result_text = result_text[:-3]
-            
-            # Parse JSON response
-            try:
-                analysis_result = json.loads(result_text)
-                return {
-                    "success": True,
-                    "cefr_level": analysis_result.get("cefr_level", "B1"),
-                    "confidence": analysis_result.get("confidence", 50),
-                    "analysis": analysis_result.get("analysis", "AI analysis completed"),
-                    "vocabulary_level": analysis_result.get("vocabulary_level", "B1"),
-                    "grammar_level": analysis_result.get("grammar_level", "B1"),
-                    "sentence_complexity": analysis_result.get("sentence_complexity", "B1"),
-                    "key_indicators": analysis_result.get("key_indicators", []),
-                    "word_count_estimate": analysis_result.get("word_count_estimate", len(text.split()))
-                }
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON parsing error in CEFR detection: {e}")
-                if allow_fallback:
-                    heur = self._heuristic_cefr(text)
-                    return {
-                        "success": True,
-                        "cefr_level": heur["cefr_level"],
-                        "confidence": heur["confidence"],
-                        "analysis": heur["analysis"],
-                        "vocabulary_level": heur["cefr_level"],
-                        "grammar_level": heur["cefr_level"],
-                        "sentence_complexity": heur["cefr_level"],
-                        "key_indicators": heur["key_indicators"],
-                        "word_count_estimate": heur["word_count_estimate"],
-                    }
-                return {"success": False, "error": "Failed to parse AI response", "cefr_level": None}
-                
-        except Exception as e:
-            logger.error(f"Error in CEFR level detection: {e}")
-            if allow_fallback:
-                heur = self._heuristic_cefr(text)
+    def _local_cefr(self, text: str, tokens: List[str], allow_fallback: bool) -> Optional[Dict[str, any]]:
+        """
+        Result decided without Gemini, else None. Very short texts (a title, a sentence or two)
+        skip Gemini only when the caller accepts a fallback: the heuristic rates nearly every
+        such text A1, which callers storing an AI level (allow_fallback=False) can't use.
+        """
+        if allow_fallback and tokens and len(text) < CEFR_HEURISTIC_MAX_CHARS:
+            return self._cefr_failure(text, CEFR_TOO_SHORT_ERROR, allow_fallback, tokens)
+        return self._fast_cefr(text, tokens)
+    
+    @staticmethod
+    def _fast_cefr(text: str, tokens: List[str]) -> Optional[Dict[str, any]]:
+        """
+        High-confidence local result for clearly A1 or clearly C1+ texts, else None.
+        One pass over the tokens: average word length, sentence length and share of long (8+) words.
+        """
+        words = [word for word in (token.strip('.,;:!?"\'()-') for token in tokens) if word]
+        num_words = len(words)
+        if num_words < FAST_CEFR_MIN_WORDS:
+            return None
+        
+        num_sentences = max(1, sum(text.count(mark) for mark in ".?!"))
+        avg_word_length = sum(map(len, words)) / num_words
+        avg_sentence_length = num_words / num_sentences
+        long_ratio = sum(1 for word in words if len(word) >= 8) / num_words
+        
+        for level, confidence, matches in _FAST_CEFR_RULES:
+            if matches(avg_word_length, avg_sentence_length, long_ratio):
                 return {
                     "success": True,
-                    "cefr_level": heur["cefr_level"],
-                    "confidence": heur["confidence"],
-                    "analysis": heur["analysis"],
-                    "vocabulary_level": heur["cefr_level"],
-                    "grammar_level": heur["cefr_level"],
-                    "sentence_complexity": heur["cefr_level"],
-                    "key_indicators": heur["key_indicators"],
-                    "word_count_estimate": heur["word_count_estimate"],
+                    "cefr_level": level,
+                    "confidence": confidence,
+                    "analysis": "Local lexical pre-filter (no AI call): unambiguous word and sentence statistics",
+                    "vocabulary_level": level,
+                    "grammar_level": level,
+                    "sentence_complexity": level,
+                    "key_indicators": [
+                        f"avg_word_length={avg_word_length:.1f}",
+                        f"avg_words_per_sentence={avg_sentence_length:.1f}",
+                        f"long_word_ratio={long_ratio:.2f}"
+                    ],
+                    "word_count_estimate": num_words
                 }
-            return {"success": False, "error": str(e), "cefr_level": None}
+        return None
 
-    def _heuristic_cefr(self, text: str) -> Dict[str, any]:
+    @staticmethod
+    def _heuristic_cefr(text: str, tokens: Optional[List[str]] = None) -> Dict[str, any]:
         """Lightweight fallback CEFR estimator using length, sentence length and complex-word ratio."""
         clean = (text or "").strip()
-        words = clean.split()
+        words = tokens if tokens is not None else clean.split()
         num_words = len(words)
         sentences = [s for s in clean.replace('?', '.').replace('!', '.').split('.') if s.strip()]
         num_sent = max(1, len(sentences))
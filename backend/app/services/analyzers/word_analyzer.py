@@ -138,6 +138,7 @@ class WordAnalyzer:
         """
         try:
             from app.models.user_vocabulary import UserVocabulary, Vocabulary
+            from sqlalchemy import func
             
             # Metindeki tüm kelimeleri al
             words_in_text = re.findall(r'\b\w+\b', text.lower())
@@ -162,9 +163,9 @@ class WordAnalyzer:
             ]
             
             # Kullanıcının toplam kelime bilgisi
-            total_user_vocabularies = db_session.query(UserVocabulary).filter(
+            total_user_vocabularies = db_session.query(func.count(UserVocabulary.id)).filter(
                 UserVocabulary.user_id == user_id
-            ).count()
+            ).scalar() or 0
             
             known_count = len(known_words_in_text)
             unknown_count = len(unknown_words_in_text)
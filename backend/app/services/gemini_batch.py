@@ -0,0 +1,191 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on in-flight Gemini calls per model
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+# Token-bucket rate limit (requests/second, burst = one second's worth)
+REQUESTS_PER_SECOND = float(os.getenv("GEMINI_REQUESTS_PER_SECOND", "10"))
+# Retries for rate-limit (429) / transient server errors, with exponential backoff
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = 1.0  # seconds; doubled per attempt
+
+_RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class _TokenBucket:
+    """Async token bucket: acquire() waits until a request slot is available"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class JsonObjectScanner:
+    """
+    Incremental brace tracker for a streamed JSON object
+    feed() returns True once the first top-level object has closed; braces inside
+    strings (and escaped quotes) are ignored
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, chunk: str) -> bool:
+        for char in chunk:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = self.started
+            elif char == "{":
+                self.depth += 1
+                self.started = True
+            elif char == "}" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        return False
+
+
+class GeminiBatchProcessor:
+    """
+    Concurrency and rate limiter in front of one GenerativeModel
+
+    Callers submit prompts and await the generated text. Each prompt is dispatched at once
+    as its own task; the calls run concurrently, bounded by MAX_CONCURRENCY and the
+    token-bucket rate limit, and rate-limited/transient failures are retried with backoff.
+    Gemini has no multi-prompt request, so holding prompts back to group them would only
+    add latency.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_concurrency: int = MAX_CONCURRENCY,
+        requests_per_second: float = REQUESTS_PER_SECOND
+    ):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket: Optional[_TokenBucket] = None
+        self._in_flight = set()
+
+    def _ensure_limits(self) -> None:
+        """Create the semaphore and token bucket (again on a new event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket = _TokenBucket(self.requests_per_second, max(1.0, self.requests_per_second))
+
+    async def submit(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        stop_at_json: bool = False
+    ) -> str:
+        """
+        Queue a prompt and wait for its generated text
+        generation_config (optional) overrides the model's config for this call only
+        stop_at_json: return as soon as the first JSON object in the stream is complete
+
+        Raises:
+            Whatever the Gemini call raised for this prompt
+        """
+        self._ensure_limits()
+        future = self._loop.create_future()
+        task = self._loop.create_task(self._run((prompt, generation_config, stop_at_json, future)))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. client disconnected): free the slot instead of finishing the call
+            task.cancel()
+            raise
+
+    async def _run(self, item: Tuple[str, Optional[Dict[str, Any]], bool, asyncio.Future]) -> None:
+        prompt, generation_config, stop_at_json, future = item
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    text = await self._generate(prompt, generation_config, stop_at_json)
+                    break
+                except _RETRYABLE_ERRORS as e:
+                    if attempt == MAX_RETRIES:
+                        raise
+                    delay = RETRY_BASE_DELAY * 2 ** attempt
+                    logger.warning("Gemini call failed (%s), retrying in %.1fs", type(e).__name__, delay)
+                    # Back off outside the semaphore so other prompts keep the slots busy
+                    await asyncio.sleep(delay)
+            if not future.done():
+                future.set_result(text)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
+    async def _generate(self, prompt: str, generation_config: Optional[Dict[str, Any]], stop_at_json: bool) -> str:
+        """One rate-limited streaming call; returns the joined, stripped text"""
+        async with self._semaphore:
+            await self._bucket.acquire()
+            response = await self.model.generate_content_async(
+                prompt, generation_config=generation_config, stream=True
+            )
+            chunks: List[str] = []
+            scanner = JsonObjectScanner() if stop_at_json else None
+            async for chunk in response:
+                chunks.append(chunk.text)
+                # Remaining tokens (closing fence, trailing text) are not needed
+                if scanner is not None and scanner.feed(chunk.text):
+                    break
+        return "".join(chunks).strip()
+
+
+_processors: Dict[int, GeminiBatchProcessor] = {}
+
+
+def get_batch_processor(model) -> GeminiBatchProcessor:
+    """Process-wide processor per (shared) model instance"""
+    processor = _processors.get(id(model))
+    if processor is None:
+        processor = GeminiBatchProcessor(model)
+        _processors[id(model)] = processor
+    return processor
@@ -0,0 +1,72 @@
+import os
+import logging
+import threading
+from typing import Dict, Optional
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+# genai.configure() rebuilds the SDK's clients (and their gRPC channels), so it must run
+# once per process instead of in every service __init__
+_configured = False
+_lock = threading.Lock()
+_models: Dict[tuple, "genai.GenerativeModel"] = {}
+
+# gRPC keeps one long-lived HTTP/2 channel per SDK client and multiplexes calls on it, so
+# TLS is negotiated once per process. Async calls (generate_content_async) go through the
+# SDK's grpc_asyncio client, which is also created once and reused.
+# "rest" opens plain HTTPS requests instead (e.g. behind proxies that block gRPC); the SDK
+# sends those through its own pooled session, so no separate HTTP client is configured here.
+# Services must get models from get_generative_model() rather than constructing their own.
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "grpc")
+
+
+def configure_gemini() -> None:
+    """
+    Configure the Gemini SDK once per process
+
+    Raises:
+        ValueError: If no API key is set
+    """
+    global _configured
+    if _configured:
+        return
+    with _lock:
+        if _configured:
+            return
+        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY environment variable is required")
+        genai.configure(api_key=api_key, transport=GEMINI_TRANSPORT)
+        _configured = True
+        logger.info("Gemini client configured (%s transport)", GEMINI_TRANSPORT)
+
+
+def get_generative_model(
+    model_name: str,
+    system_instruction: Optional[str] = None,
+    generation_config: Optional["genai.GenerationConfig"] = None
+) -> "genai.GenerativeModel":
+    """
+    Return a process-wide GenerativeModel for this configuration
+    Models share the SDK's underlying client, so connections are reused across requests
+
+    Args:
+        model_name: Gemini model name
+        system_instruction: Optional static system instruction
+        generation_config: Optional generation config (module-level constant expected)
+    """
+    configure_gemini()
+    key = (model_name, system_instruction, id(generation_config))
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(
+                    model_name,
+                    system_instruction=system_instruction,
+                    generation_config=generation_config
+                )
+                _models[key] = model
+    return model
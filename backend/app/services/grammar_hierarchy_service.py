@@ -1,11 +1,58 @@
 import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Set, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.models.user_vocabulary import User, UserGrammarKnowledge, GrammarPattern
+from app.core.cache import invalidate_user_knowledge
 
 logger = logging.getLogger(__name__)
 
+# Key for the per-request grammar state stored in Session.info (one Session per request via get_db)
+_STATE_KEY = "user_grammar_state"
+# calculate_user_level results for the rest of the request, same lifetime as the grammar state
+_LEVEL_KEY = "user_level_info"
+
+# How long users.cefr_level is trusted before calculate_user_level runs again
+# (vocabulary/grammar writes reset it immediately via mark_level_stale)
+CEFR_LEVEL_TTL = timedelta(hours=24)
+
+# Level -> next level, built once instead of a list.index() per call
+_LEVEL_ORDER = ("A1", "A2", "B1", "B2", "C1", "C2")
+_NEXT_LEVEL = {level: _LEVEL_ORDER[min(index + 1, len(_LEVEL_ORDER) - 1)] for index, level in enumerate(_LEVEL_ORDER)}
+
+# Minimum requirements to START each level
+_LEVEL_REQUIREMENTS = {
+    "A1": {"vocab": 0, "grammar": ()},  # Starting level
+    "A2": {"vocab": 1000, "grammar": ("A1",)},  # Need A1 to start A2
+    "B1": {"vocab": 2000, "grammar": ("A1", "A2")},  # Need A1+A2 to start B1
+    "B2": {"vocab": 5000, "grammar": ("A1", "A2", "B1")},  # Need A1+A2+B1 to start B2
+    "C1": {"vocab": 7500, "grammar": ("A1", "A2", "B1", "B2")},  # Need A1+A2+B1+B2 to start C1
+    "C2": {"vocab": 10000, "grammar": ("A1", "A2", "B1", "B2", "C1")}  # Need A1+A2+B1+B2+C1 to start C2
+}
+
+# Share of the grammar score each level's patterns are worth
+_LEVEL_GRAMMAR_WEIGHTS = {"A1": 10, "A2": 15, "B1": 20, "B2": 25, "C1": 15, "C2": 15}
+
+# CEFR level score ranges (0-100)
+_LEVEL_SCORE_RANGES = {
+    "A1": (0, 16.67),
+    "A2": (16.67, 33.33),
+    "B1": (33.33, 50.0),
+    "B2": (50.0, 66.67),
+    "C1": (66.67, 83.33),
+    "C2": (83.33, 100)
+}
+
+
+@dataclass
+class UserGrammarState:
+    """Snapshot of a user's grammar/vocabulary knowledge, loaded once per request"""
+    known: frozenset
+    practice: frozenset
+    vocab_count: Optional[int] = None  # Loaded lazily, only level calculations need it
+
 
 class GrammarHierarchyService:
     """
@@ -70,6 +117,77 @@ class GrammarHierarchyService:
         ]
     }
     
+    # Reverse lookup pattern -> level, built once from the static hierarchy
+    PATTERN_LEVELS = {
+        pattern: level
+        for level, patterns in GRAMMAR_HIERARCHY.items()
+        for pattern in patterns
+    }
+    
+    def get_user_grammar_state(self, user_id: int, db: Session) -> UserGrammarState:
+        """
+        Return the user's grammar state, cached on the Session for the rest of the request
+        One SELECT loads known and practice patterns together; writes invalidate the entry
+        """
+        states = db.info.setdefault(_STATE_KEY, {})
+        state = states.get(user_id)
+        if state is None:
+            rows = db.query(UserGrammarKnowledge.grammar_pattern, UserGrammarKnowledge.status).filter(
+                UserGrammarKnowledge.user_id == user_id,
+                UserGrammarKnowledge.status.in_(["known", "practice"])
+            ).all()
+            state = UserGrammarState(
+                known=frozenset(pattern for pattern, status in rows if status == "known"),
+                practice=frozenset(pattern for pattern, status in rows if status == "practice")
+            )
+            states[user_id] = state
+        return state
+    
+    def invalidate_user_grammar_state(self, user_id: int, db: Session) -> None:
+        """Drop the cached state (and level) after a write so the next read reloads it"""
+        db.info.get(_STATE_KEY, {}).pop(user_id, None)
+        db.info.get(_LEVEL_KEY, {}).pop(user_id, None)
+    
+    def get_current_level(self, user_id: int, db: Session) -> str:
+        """
+        User's current CEFR level, read from users.cefr_level while it is fresh
+        Falls back to calculate_user_level when missing or stale; the result is flushed in a
+        savepoint of the caller's transaction and persisted when the caller commits
+        """
+        user = db.get(User, user_id)
+        if user is None:
+            return "A1"
+        
+        computed_at = user.cefr_level_computed_at
+        if user.cefr_level and computed_at and datetime.now(timezone.utc) - computed_at < CEFR_LEVEL_TTL:
+            return user.cefr_level
+        
+        level_info = self.calculate_user_level(user_id, db)
+        level = level_info.get("user_level", {}).get("level", "A1")
+        if level_info.get("success"):
+            try:
+                # Savepoint: a failed write doesn't roll back the caller's pending changes
+                with db.begin_nested():
+                    user.cefr_level = level
+                    user.cefr_level_computed_at = datetime.now(timezone.utc)
+            except Exception as e:
+                logger.error("Error storing CEFR level for user %s: %s", user_id, e)
+        return level
+    
+    @staticmethod
+    def mark_level_stale(user_id: int, db: Session) -> None:
+        """
+        Reset the stored CEFR level in the caller's transaction; the next read recomputes it
+        Also bumps knowledge_version so cached known words/grammar are rebuilt in every process
+        """
+        db.query(User).filter(User.id == user_id).update(
+            {User.cefr_level_computed_at: None, User.knowledge_version: User.knowledge_version + 1},
+            synchronize_session=False
+        )
+        # Request-scoped snapshots (vocab_count in the grammar state, the level info) are stale too
+        db.info.get(_STATE_KEY, {}).pop(user_id, None)
+        db.info.get(_LEVEL_KEY, {}).pop(user_id, None)
+    
     def calculate_user_level(self, user_id: int, db: Session) -> Dict:
         """
         Calculate user's level based on BOTH vocabulary AND grammar requirements
@@ -87,27 +205,27 @@ class GrammarHierarchyService:
             db: Database session
             
         Returns:
-            Dict with detailed level and progress information
+            Dict with detailed level and progress information (shared per request; don't mutate)
         """
+        levels = db.info.setdefault(_LEVEL_KEY, {})
+        level_info = levels.get(user_id)
+        if level_info is None:
+            level_info = self._calculate_user_level(user_id, db)
+            if level_info.get("success"):
+                levels[user_id] = level_info
+        return level_info
+    
+    def _calculate_user_level(self, user_id: int, db: Session) -> Dict:
+        """Uncached calculate_user_level"""
         try:
             # Get current vocabulary and grammar knowledge
             vocab_count = self._get_vocabulary_count(user_id, db)
             grammar_knowledge = self._get_grammar_knowledge_by_level(user_id, db)
             
-            # Define level requirements (minimum requirements to START each level)
-            level_requirements = {
-                "A1": {"vocab": 0, "grammar": []},  # Starting level
-                "A2": {"vocab": 1000, "grammar": ["A1"]},  # Need A1 to start A2
-                "B1": {"vocab": 2000, "grammar": ["A1", "A2"]},  # Need A1+A2 to start B1
-                "B2": {"vocab": 5000, "grammar": ["A1", "A2", "B1"]},  # Need A1+A2+B1 to start B2
-                "C1": {"vocab": 7500, "grammar": ["A1", "A2", "B1", "B2"]},  # Need A1+A2+B1+B2 to start C1
-                "C2": {"vocab": 10000, "grammar": ["A1", "A2", "B1", "B2", "C1"]}  # Need A1+A2+B1+B2+C1 to start C2
-            }
-            
             # Determine current level (which level the user is currently working on)
             current_level = "A1"
-            for level in ["C2", "C1", "B2", "B1", "A2", "A1"]:  # Check from highest to lowest
-                req = level_requirements[level]
+            for level in reversed(_LEVEL_ORDER):  # Check from highest to lowest
+                req = _LEVEL_REQUIREMENTS[level]
                 
                 # Check if user meets minimum requirements to START this level
                 vocab_met = vocab_count >= req["vocab"]
@@ -135,7 +253,7 @@ class GrammarHierarchyService:
             # For vocabulary, use the next level's requirement as target
             next_level = self._get_next_level(current_level)
             if next_level != current_level:
-                next_req = level_requirements[next_level]
+                next_req = _LEVEL_REQUIREMENTS[next_level]
                 vocab_target = next_req["vocab"]
                 vocab_progress = min(100, (vocab_count / vocab_target) * 100)
             else:
@@ -152,7 +270,7 @@ class GrammarHierarchyService:
             # Overall progress to next level
             next_level = self._get_next_level(current_level)
             if next_level != current_level:
-                next_req = level_requirements[next_level]
+                next_req = _LEVEL_REQUIREMENTS[next_level]
                 
                 # Progress towards next level requirements
                 vocab_progress_next = min(100, (vocab_count / next_req["vocab"]) * 100)
@@ -229,12 +347,7 @@ class GrammarHierarchyService:
     def _get_vocabulary_score(self, user_id: int, db: Session) -> float:
         """Calculate vocabulary score (0-100) based on CEFR standards"""
         try:
-            from app.models.user_vocabulary import UserVocabulary
-            
-            known_words = db.query(UserVocabulary).filter(
-                UserVocabulary.user_id == user_id,
-                UserVocabulary.status == "known"
-            ).count()
+            known_words = self._get_vocabulary_count(user_id, db)
             
             # CEFR-based vocabulary scoring
             if known_words == 0:
@@ -259,19 +372,12 @@ class GrammarHierarchyService:
     def _get_grammar_score(self, user_id: int, db: Session) -> float:
         """Calculate grammar score (0-100) based on known patterns"""
         try:
-            known_grammar = db.query(UserGrammarKnowledge).filter(
-                UserGrammarKnowledge.user_id == user_id,
-                UserGrammarKnowledge.status == "known"
-            ).all()
-            
-            known_patterns = [g.grammar_pattern for g in known_grammar]
+            known_patterns = self.get_user_grammar_state(user_id, db).known
             total_score = 0
             
             # Score based on hierarchy
             for level, patterns in self.GRAMMAR_HIERARCHY.items():
-                level_score = {
-                    "A1": 10, "A2": 15, "B1": 20, "B2": 25, "C1": 15, "C2": 15
-                }[level]
+                level_score = _LEVEL_GRAMMAR_WEIGHTS[level]
                 
                 known_in_level = sum(1 for pattern in patterns if pattern in known_patterns)
                 total_in_level = len(patterns)
@@ -289,22 +395,12 @@ class GrammarHierarchyService:
     def _score_to_level(self, total_score: float, vocab_score: float, grammar_score: float) -> Dict:
         """Convert scores to level designation with within-level progress"""
         
-        # Define CEFR level ranges
-        level_ranges = {
-            "A1": (0, 16.67),
-            "A2": (16.67, 33.33),
-            "B1": (33.33, 50.0),
-            "B2": (50.0, 66.67),
-            "C1": (66.67, 83.33),
-            "C2": (83.33, 100)
-        }
-        
         # Determine current level
         level = "A1"
         level_min = 0
         level_max = 16.67
         
-        for level_name, (min_score, max_score) in level_ranges.items():
+        for level_name, (min_score, max_score) in _LEVEL_SCORE_RANGES.items():
             if min_score <= total_score < max_score:
                 level = level_name
                 level_min = min_score
@@ -337,16 +433,8 @@ class GrammarHierarchyService:
         }
     
     def _get_next_level(self, current_level: str) -> str:
-        """Get the next CEFR level"""
-        level_order = ["A1", "A2", "B1", "B2", "C1", "C2"]
-        try:
-            current_index = level_order.index(current_level)
-            if current_index < len(level_order) - 1:
-                return level_order[current_index + 1]
-            else:
-                return "C2"  # Already at max level
-        except ValueError:
-            return "A2"  # Default fallback
+        """Get the next CEFR level (C2 stays C2, unknown levels fall back to A2)"""
+        return _NEXT_LEVEL.get(current_level, "A2")
     
     def _analyze_balance(self, vocab_score: float, grammar_score: float) -> str:
         """Analyze vocabulary vs grammar balance"""
@@ -369,9 +457,9 @@ class GrammarHierarchyService:
         Returns:
             Difficulty level string (A1, A2, B1, B2, C1, C2) or 'unknown' if not found
         """
-        for level, patterns in self.GRAMMAR_HIERARCHY.items():
-            if pattern_name in patterns:
-                return level
+        level = self.PATTERN_LEVELS.get(pattern_name)
+        if level:
+            return level
         
         # Don't assume unknown patterns - be honest that we don't know
         logger.warning(f"Pattern '{pattern_name}' not found in GRAMMAR_HIERARCHY, marking as unknown")
@@ -392,12 +480,7 @@ class GrammarHierarchyService:
     def _get_level_recommendations(self, user_id: int, db: Session) -> List[str]:
         """Get personalized learning recommendations"""
         try:
-            known_grammar = db.query(UserGrammarKnowledge).filter(
-                UserGrammarKnowledge.user_id == user_id,
-                UserGrammarKnowledge.status == "known"
-            ).all()
-            
-            known_patterns = set(g.grammar_pattern for g in known_grammar)
+            known_patterns = self.get_user_grammar_state(user_id, db).known
             recommendations = []
             
             # Find next patterns to learn
@@ -426,21 +509,10 @@ class GrammarHierarchyService:
             List of grammar patterns user doesn't know yet
         """
         try:
-            # Get user's known grammar patterns
-            known_grammar = db.query(UserGrammarKnowledge).filter(
-                UserGrammarKnowledge.user_id == user_id,
-                UserGrammarKnowledge.status == "known"
-            ).all()
-            
-            known_patterns = set(g.grammar_pattern for g in known_grammar)
-            
-            # Also check for "practice" status - include these too
-            practice_grammar = db.query(UserGrammarKnowledge).filter(
-                UserGrammarKnowledge.user_id == user_id,
-                UserGrammarKnowledge.status == "practice"
-            ).all()
-            
-            practice_patterns = set(g.grammar_pattern for g in practice_grammar)
+            # Get user's known grammar patterns (and "practice" ones - include these too)
+            state = self.get_user_grammar_state(user_id, db)
+            known_patterns = state.known
+            practice_patterns = state.practice
             
             # Filter: unknown patterns + practice patterns
             unknown_patterns = [
@@ -484,7 +556,10 @@ class GrammarHierarchyService:
                 )
                 db.add(new_knowledge)
             
+            self.mark_level_stale(user_id, db)
             db.commit()
+            self.invalidate_user_grammar_state(user_id, db)
+            invalidate_user_knowledge(user_id)
             
             return {
                 "success": True,
@@ -502,18 +577,9 @@ class GrammarHierarchyService:
     def get_user_grammar_overview(self, user_id: int, db: Session) -> Dict:
         """Get comprehensive overview of user's grammar knowledge"""
         try:
-            known_grammar = db.query(UserGrammarKnowledge).filter(
-                UserGrammarKnowledge.user_id == user_id,
-                UserGrammarKnowledge.status == "known"
-            ).all()
-            
-            practice_grammar = db.query(UserGrammarKnowledge).filter(
-                UserGrammarKnowledge.user_id == user_id,
-                UserGrammarKnowledge.status == "practice"
-            ).all()
-            
-            known_patterns = set(g.grammar_pattern for g in known_grammar)
-            practice_patterns = set(g.grammar_pattern for g in practice_grammar)
+            state = self.get_user_grammar_state(user_id, db)
+            known_patterns = state.known
+            practice_patterns = state.practice
             
             overview = {}
             for level, patterns in self.GRAMMAR_HIERARCHY.items():
@@ -547,10 +613,14 @@ class GrammarHierarchyService:
         try:
             from app.models.user_vocabulary import UserVocabulary
             
-            return db.query(UserVocabulary).filter(
-                UserVocabulary.user_id == user_id,
-                UserVocabulary.status == "known"
-            ).count()
+            state = self.get_user_grammar_state(user_id, db)
+            if state.vocab_count is None:
+                # count(*) needs no heap column, so the covering (user_id, status) index suffices
+                state.vocab_count = db.query(func.count()).select_from(UserVocabulary).filter(
+                    UserVocabulary.user_id == user_id,
+                    UserVocabulary.status == "known"
+                ).scalar() or 0
+            return state.vocab_count
             
         except Exception as e:
             logger.error(f"Error getting vocabulary count: {str(e)}")
@@ -559,13 +629,7 @@ class GrammarHierarchyService:
     def _get_grammar_knowledge_by_level(self, user_id: int, db: Session) -> Dict[str, List[str]]:
         """Get grammar knowledge organized by level"""
         try:
-            # UserGrammarKnowledge is already imported at the top
-            known_grammar = db.query(UserGrammarKnowledge).filter(
-                UserGrammarKnowledge.user_id == user_id,
-                UserGrammarKnowledge.status == "known"
-            ).all()
-            
-            known_patterns = [g.grammar_pattern for g in known_grammar]
+            known_patterns = self.get_user_grammar_state(user_id, db).known
             
             # Organize by level
             knowledge_by_level = {}
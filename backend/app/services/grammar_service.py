@@ -2,6 +2,8 @@ from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from app.models.user_vocabulary import User, UserGrammarKnowledge, GrammarPattern
 from app.core.database import get_db
+from app.core.cache import invalidate_user_knowledge
+from app.services.grammar_hierarchy_service import GrammarHierarchyService
 
 class GrammarService:
     
@@ -157,7 +159,9 @@ class GrammarService:
                 )
                 db.add(new_knowledge)
             
+            GrammarHierarchyService.mark_level_stale(user_id, db)
             db.commit()
+            invalidate_user_knowledge(user_id)
             return True
             
         except Exception as e:
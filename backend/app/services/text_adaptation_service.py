@@ -1,12 +1,17 @@
 import re
-from typing import List, Dict, Tuple, Set
+from collections import Counter
+from typing import List, Dict, Tuple, Set, FrozenSet
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.user_vocabulary import User, UserVocabulary, Vocabulary
+from app.core.cache import USER_KNOWLEDGE_CACHE
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Words: letters + apostrophes for contractions ("doesn't", "you're"); compiled once
+_WORD_RE = re.compile(r"\b[a-zA-Z]+(?:'[a-zA-Z]+)?\b")
+
 class TextAdaptationService:
     """
     Krashen's i+1 Hypothesis Implementation
@@ -21,13 +26,8 @@ class TextAdaptationService:
         Clean text and extract words, removing punctuation and converting to lowercase.
         Also handles contractions like "doesn't", "you're", etc.
         """
-        # Remove extra whitespace and normalize
-        text = re.sub(r'\s+', ' ', text.strip())
-        
-        # Extract words (letters + apostrophes for contractions)
-        words = re.findall(r'\b[a-zA-Z]+(?:\'[a-zA-Z]+)?\b', text.lower())
-        
-        return words
+        # Whitespace never ends up inside a token, so no normalization pass is needed
+        return _WORD_RE.findall(text.lower())
     
     @staticmethod
     def clean_word_for_comparison(word: str) -> str:
@@ -37,34 +37,48 @@ class TextAdaptationService:
         return word.lower().strip()
     
     @staticmethod
-    def get_user_known_words(username: str, db: Session) -> Set[str]:
+    def build_word_lookup(words: Set[str]) -> Set[str]:
+        """
+        Words plus their "to "-stripped forms ("to speak" -> "speak").
+        Built once per call so each token is a single set lookup instead of a scan over all words.
+        """
+        lookup = set(words)
+        lookup.update(word[3:] for word in words if word.startswith('to '))
+        return lookup
+    
+    @staticmethod
+    def get_user_known_words(username: str, db: Session) -> FrozenSet[str]:
         """
         Get all words that user knows (status='known') from database.
+        Cached per user (frozenset, shared) until their vocabulary changes or the TTL expires.
         """
         try:
-            user = db.query(User).filter(User.username == username).first()
+            # The username lookup has to run anyway; selecting the version with the id makes
+            # a cache hit this one narrow row read (no ORM User, no vocabulary query)
+            user = db.query(User.id, User.knowledge_version).filter(User.username == username).first()
             if not user:
-                return set()
+                return frozenset()
             
-            # Sadece 'known' status'lu kelimeleri al
-            user_vocab = db.query(UserVocabulary).filter(
+            cache_key = ("known_only", user.id)
+            cached = USER_KNOWLEDGE_CACHE.get(cache_key)
+            if cached is not None and cached[0] == user.knowledge_version:
+                return cached[1]
+            
+            # Sadece 'known' status'lu kelimeleri al: one joined query, word column only
+            rows = db.query(Vocabulary.word).join(
+                UserVocabulary, UserVocabulary.vocabulary_id == Vocabulary.id
+            ).filter(
                 UserVocabulary.user_id == user.id,
                 UserVocabulary.status == "known"  # Sadece bilinen kelimeler
             ).all()
             
-            known_words = set()
-            for uv in user_vocab:
-                vocab_word = db.query(Vocabulary).filter(
-                    Vocabulary.id == uv.vocabulary_id
-                ).first()
-                if vocab_word:
-                    known_words.add(vocab_word.word.lower())
-            
+            known_words = frozenset(word.lower() for (word,) in rows)
+            USER_KNOWLEDGE_CACHE.set(cache_key, (user.knowledge_version, known_words))
             return known_words
             
         except Exception as e:
-            logger.error(f"Error getting user vocabulary: {e}")
-            return set()
+            logger.error("Error getting user vocabulary: %s", e)
+            return frozenset()
 
     @staticmethod
     def get_user_ignored_words(username: str, db: Session) -> Set[str]:
@@ -77,24 +91,18 @@ class TextAdaptationService:
             if not user:
                 return set()
             
-            # Get only ignored words
-            user_vocab = db.query(UserVocabulary).filter(
+            # Get only ignored words (one joined query, word column only)
+            rows = db.query(Vocabulary.word).join(
+                UserVocabulary, UserVocabulary.vocabulary_id == Vocabulary.id
+            ).filter(
                 UserVocabulary.user_id == user.id,
                 UserVocabulary.status == "ignored"
             ).all()
             
-            ignored_words = set()
-            for uv in user_vocab:
-                vocab_word = db.query(Vocabulary).filter(
-                    Vocabulary.id == uv.vocabulary_id
-                ).first()
-                if vocab_word:
-                    ignored_words.add(vocab_word.word.lower())
-            
-            return ignored_words
+            return {word.lower() for (word,) in rows}
             
         except Exception as e:
-            logger.error(f"Error getting user ignored vocabulary: {e}")
+            logger.error("Error getting user ignored vocabulary: %s", e)
             return set()
     
     @staticmethod
@@ -108,24 +116,18 @@ class TextAdaptationService:
             if not user:
                 return set()
             
-            # Get only unknown words
-            user_vocab = db.query(UserVocabulary).filter(
+            # Get only unknown words (one joined query, word column only)
+            rows = db.query(Vocabulary.word).join(
+                UserVocabulary, UserVocabulary.vocabulary_id == Vocabulary.id
+            ).filter(
                 UserVocabulary.user_id == user.id,
                 UserVocabulary.status == "unknown"
             ).all()
             
-            unknown_words = set()
-            for uv in user_vocab:
-                vocab_word = db.query(Vocabulary).filter(
-                    Vocabulary.id == uv.vocabulary_id
-                ).first()
-                if vocab_word:
-                    unknown_words.add(vocab_word.word.lower())
-            
-            return unknown_words
+            return {word.lower() for (word,) in rows}
             
         except Exception as e:
-            logger.error(f"Error getting user unknown vocabulary: {e}")
+            logger.error("Error getting user unknown vocabulary: %s", e)
             return set()
     
     @staticmethod
@@ -147,9 +149,11 @@ class TextAdaptationService:
             }
         
         # Count known vs unknown with flexible matching
+        known_lookup = TextAdaptationService.build_word_lookup(known_words)
+        
         def is_word_known(word: str, known_words: Set[str]) -> bool:
-            # Direct match
-            if word in known_words:
+            # Direct match, or a known "to " + word entry
+            if word in known_lookup:
                 return True
             
             # Check for "to" prefix variations
@@ -158,11 +162,6 @@ class TextAdaptationService:
                 if base_word in known_words:
                     return True
             
-            # Check if word matches any known word that starts with "to "
-            for known_word in known_words:
-                if known_word.startswith('to ') and known_word[3:] == word:
-                    return True
-            
             return False
         
         known_count = sum(1 for word in words if is_word_known(word, known_words))
@@ -208,12 +207,14 @@ class TextAdaptationService:
             ignored_words = TextAdaptationService.get_user_ignored_words(username, db)
             unknown_words = TextAdaptationService.get_user_unknown_words(username, db)
         
+        known_lookup = TextAdaptationService.build_word_lookup(known_words)
+        
         def is_word_known(word: str, known_words: Set[str]) -> bool:
             # Clean word for comparison
             clean_word = TextAdaptationService.clean_word_for_comparison(word)
             
-            # Direct match
-            if clean_word in known_words:
+            # Direct match, or a known "to " + word entry
+            if clean_word in known_lookup:
                 return True
             
             # Check for "to" prefix variations
@@ -222,11 +223,6 @@ class TextAdaptationService:
                 if base_word in known_words:
                     return True
             
-            # Check if word matches any known word that starts with "to "
-            for known_word in known_words:
-                if known_word.startswith('to ') and known_word[3:] == clean_word:
-                    return True
-            
             # ✅ YENİ: Kelime sonları kontrolü (ed, ing, es, ies)
             # Eğer kelime bu sonlarla bitiyorsa kök kelimeyi kontrol et
             word_endings = ['ing', 'ed', 'ies', 'es']
@@ -291,12 +287,14 @@ class TextAdaptationService:
             
             return False
         
+        ignored_lookup = TextAdaptationService.build_word_lookup(ignored_words)
+        
         def is_word_ignored(word: str, ignored_words: Set[str]) -> bool:
             # Clean word for comparison
             clean_word = TextAdaptationService.clean_word_for_comparison(word)
             
-            # Direct match
-            if clean_word in ignored_words:
+            # Direct match, or a ignored "to " + word entry
+            if clean_word in ignored_lookup:
                 return True
             
             # Check for "to" prefix variations
@@ -305,11 +303,6 @@ class TextAdaptationService:
                 if base_word in ignored_words:
                     return True
             
-            # Check if word matches any ignored word that starts with "to "
-            for ignored_word in ignored_words:
-                if ignored_word.startswith('to ') and ignored_word[3:] == clean_word:
-                    return True
-            
             return False
         
         # Create word status mapping
@@ -367,11 +360,7 @@ class TextAdaptationService:
         """
         Get frequency count of each word in text.
         """
-        words = TextAdaptationService.clean_and_tokenize(text)
-        frequency = {}
-        for word in words:
-            frequency[word] = frequency.get(word, 0) + 1
-        return frequency
+        return dict(Counter(TextAdaptationService.clean_and_tokenize(text)))
     
     # Removed simplify_text_for_user method - system now uses only AI-powered adaptation
     
@@ -385,11 +374,13 @@ class TextAdaptationService:
         try:
             known_words = TextAdaptationService.get_user_known_words(username, db)
             words = TextAdaptationService.clean_and_tokenize(text)
-            word_freq = TextAdaptationService.get_word_frequency_in_text(text)
+            word_freq = Counter(words)  # Same tokens, no second tokenization pass
+            
+            known_lookup = TextAdaptationService.build_word_lookup(known_words)
             
             def is_word_known(word: str, known_words: Set[str]) -> bool:
-                # Direct match
-                if word in known_words:
+                # Direct match, or a known "to " + word entry
+                if word in known_lookup:
                     return True
                 
                 # Check for "to" prefix variations
@@ -398,11 +389,6 @@ class TextAdaptationService:
                     if base_word in known_words:
                         return True
                 
-                # Check if word matches any known word that starts with "to "
-                for known_word in known_words:
-                    if known_word.startswith('to ') and known_word[3:] == word:
-                        return True
-                
                 return False
             
             # Find unknown words using the same logic as analyze_text_difficulty
@@ -424,7 +410,7 @@ class TextAdaptationService:
             return learning_candidates[:10]  # Return top 10 learning candidates
             
         except Exception as e:
-            logger.error(f"Error identifying learning words: {e}")
+            logger.error("Error identifying learning words: %s", e)
             return []
         finally:
             db.close() 
\ No newline at end of file
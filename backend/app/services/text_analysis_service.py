@@ -2,7 +2,8 @@ import re
 from typing import Dict, List, Any, Optional
 import os
 from collections import Counter
-import google.generativeai as genai
+from pydantic_core import from_json
+from app.services.gemini_client import get_generative_model
 
 # spaCy'yi opsiyonel yapalım
 try:
@@ -15,12 +16,8 @@ except ImportError:
 
 class TextAnalysisService:
     def __init__(self):
-        # Gemini API'yi konfigüre et
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY environment variable is required")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        # Shared process-wide model (SDK configured once in gemini_client)
+        self.model = get_generative_model('gemini-2.0-flash')
         
         # spaCy modeli yüklemeye çalış, yoksa basit analiz yap
         if SPACY_AVAILABLE:
@@ -193,6 +190,7 @@ class TextAnalysisService:
         """
         try:
             from app.models.user_vocabulary import UserVocabulary, Vocabulary
+            from sqlalchemy import func
             
             # Metindeki tüm kelimeleri al
             words_in_text = re.findall(r'\b\w+\b', text.lower())
@@ -207,14 +205,14 @@ class TextAnalysisService:
             unknown_words_in_text = [w for w in unique_words_in_text if w not in user_known_words_lower and not self._is_proper_noun_or_name(w)]
             
             # Kullanıcının toplam kelime bilgisi
-            total_user_vocabularies = db_session.query(UserVocabulary).filter(
+            total_user_vocabularies = db_session.query(func.count(UserVocabulary.id)).filter(
                 UserVocabulary.user_id == user_id
-            ).count()
+            ).scalar() or 0
             
-            known_vocabularies = db_session.query(UserVocabulary).filter(
+            known_vocabularies = db_session.query(func.count(UserVocabulary.id)).filter(
                 UserVocabulary.user_id == user_id,
                 UserVocabulary.status.in_(['known', 'learning'])
-            ).count()
+            ).scalar() or 0
             
             # Seviye hesaplama
             if known_vocabularies < 500:
@@ -978,7 +976,6 @@ Maksimum 100 kelime ile yanıt ver."""
             
             # JSON parse etmeye çalış
             try:
-                import json
                 # Response'tan JSON kısmını çıkar
                 response_text = response.text.strip()
                 if "```json" in response_text:
@@ -988,7 +985,7 @@ Maksimum 100 kelime ile yanıt ver."""
                 else:
                     json_text = response_text
                 
-                parsed_response = json.loads(json_text)
+                parsed_response = from_json(json_text)
                 return {
                     "ai_analysis": parsed_response.get("genel_seviye", "Analiz tamamlandı"),
                     "grammar_insights": parsed_response.get("gramer_yapilari", "Gramer analizi yapıldı"),
@@ -1,6 +1,5 @@
-import os
 from typing import Dict, List, Any, Optional
-import google.generativeai as genai
+from app.services.gemini_client import get_generative_model
 from .analyzers.basic_statistics import BasicStatistics
 from .analyzers.word_analyzer import WordAnalyzer
 
@@ -12,12 +11,8 @@ class TextAnalysisService:
     """
     
     def __init__(self):
-        # Gemini API'yi konfigüre et
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY environment variable is required")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        # Shared process-wide model (SDK configured once in gemini_client)
+        self.model = get_generative_model('gemini-2.0-flash')
         
         # Analyzer instance'larını oluştur
         self.basic_stats = BasicStatistics()
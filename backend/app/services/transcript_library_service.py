@@ -4,6 +4,7 @@ from app.models.user_vocabulary import ProcessedTranscript, User
 from app.services.yt_dlp_service import YTDlpService
 from app.services.ai_text_adaptation_service import AITextAdaptationService
 from typing import Dict, Any, List, Optional
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,7 +16,7 @@ class TranscriptLibraryService:
         self.youtube_service = YTDlpService()
         self.ai_service = AITextAdaptationService()
     
-    def get_or_create_transcript(self, video_url: str, username: str, db: Session) -> Dict[str, Any]:
+    async def get_or_create_transcript(self, video_url: str, username: str, db: Session) -> Dict[str, Any]:
         """
         Get transcript from library or create new one.
         Enhanced with discover library check to avoid duplicate processing.
@@ -113,21 +114,22 @@ class TranscriptLibraryService:
                     "message": "Keşiften kişisel kopya oluşturuldu"
                 }
             
-            # 3) Fetch new transcript
-            transcript_result = self.youtube_service.get_transcript(video_id)
+            # 3) Fetch new transcript (blocking network I/O, kept off the event loop)
+            transcript_result = await asyncio.to_thread(self.youtube_service.get_transcript, video_id)
             if not transcript_result.get("success"):
                 return {"error": f"Failed to get transcript: {transcript_result.get('error', 'Unknown error')}"}
             
             original_text = transcript_result["transcript"]
             
             # Get video info
-            video_info = self.youtube_service.get_video_info(video_id)
+            video_info = await asyncio.to_thread(self.youtube_service.get_video_info, video_id)
             
-            # CEFR Level Detection with AI (no fallback)
-            cefr_result = self.ai_service.detect_cefr_level(original_text, allow_fallback=False)
-            
-            # AI Text Adaptation (current level approach)
-            adapted_result = self.ai_service.adapt_text_with_ai(original_text, username, db, target_unknown_percentage=5.0)
+            # CEFR Level Detection with AI (no fallback) and AI Text Adaptation (current level approach)
+            # are independent Gemini calls, so run them concurrently
+            cefr_result, adapted_result = await asyncio.gather(
+                asyncio.to_thread(self.ai_service.detect_cefr_level, original_text, allow_fallback=False),
+                self.ai_service.adapt_text_with_ai(original_text, username, db, target_unknown_percentage=5.0)
+            )
             adapted_text = adapted_result.get("adapted_text", original_text)
             
             # Save to library with AI adaptation
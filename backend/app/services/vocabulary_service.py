@@ -1,7 +1,10 @@
 import pandas as pd
 from typing import List, Optional
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from app.models.user_vocabulary import User, Vocabulary, UserVocabulary
+from app.core.cache import invalidate_user_knowledge
+from app.services.grammar_hierarchy_service import GrammarHierarchyService
 import re
 
 class VocabularyService:
@@ -163,7 +166,9 @@ class VocabularyService:
                 
                 db.add(user_vocab)
             
+            GrammarHierarchyService.mark_level_stale(user_id, db)
             db.commit()
+            invalidate_user_knowledge(user_id)
             print(f"✅ Successfully added vocabulary")
             return {
                 "success": True, 
@@ -187,17 +192,15 @@ class VocabularyService:
         """
         try:
             # Known ve learning status'taki kelimeleri al
-            user_vocabs = db.query(UserVocabulary).join(Vocabulary).filter(
-                UserVocabulary.user_id == user_id,
-                UserVocabulary.status.in_(['known', 'learning'])
-            ).all()
-            
-            known_words = []
-            for user_vocab in user_vocabs:
-                if user_vocab.vocabulary:
-                    known_words.append(user_vocab.vocabulary.word)
-            
-            return known_words
+            # Sadece kelime kolonu seçilir: ORM nesnesi ve satır başına lazy load (N+1) yok
+            return list(db.scalars(
+                select(Vocabulary.word).join_from(
+                    UserVocabulary, Vocabulary, UserVocabulary.vocabulary_id == Vocabulary.id
+                ).where(
+                    UserVocabulary.user_id == user_id,
+                    UserVocabulary.status.in_(['known', 'learning'])
+                )
+            ))
             
         except Exception as e:
             print(f"❌ Get known words error: {str(e)}")
@@ -227,7 +230,9 @@ class VocabularyService:
                 db.add(user_vocab)
                 added_count += 1
         
+        GrammarHierarchyService.mark_level_stale(user.id, db)
         db.commit()
+        invalidate_user_knowledge(user.id)
         return added_count
     
     @staticmethod
@@ -235,10 +240,10 @@ class VocabularyService:
         """
         Calculate user's vocabulary level (i level)
         """
-        total_known_words = db.query(UserVocabulary).filter(
+        total_known_words = db.query(func.count(UserVocabulary.id)).filter(
             UserVocabulary.user_id == user.id,
             UserVocabulary.is_known == True
-        ).count()
+        ).scalar() or 0
         
         # Simple level calculation (can be made more sophisticated)
         if total_known_words < 500:
@@ -1,8 +1,8 @@
-import os
 import logging
 from typing import Dict, Optional
 from sqlalchemy.orm import Session
-import google.generativeai as genai
+from pydantic_core import from_json
+from app.services.gemini_client import get_generative_model
 from app.models.word_cache import WordDefinition
 
 logger = logging.getLogger(__name__)
@@ -15,11 +15,8 @@ class WordCacheService:
     """
     
     def __init__(self):
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY environment variable is required")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        # Shared process-wide model (SDK configured once in gemini_client)
+        self.model = get_generative_model('gemini-2.0-flash')
     
     async def get_word_explanation(self, word: str, db: Session) -> Dict:
         """
@@ -40,7 +37,7 @@ class WordCacheService:
             ).first()
             
             if cached_definition:
-                logger.info(f"Cache hit for word: {word}")
+                logger.info("Cache hit for word: %s", word)
                 return {
                     "success": True,
                     "cached": True,
@@ -48,7 +45,7 @@ class WordCacheService:
                 }
             
             # 2. Generate with AI if not in cache
-            logger.info(f"Cache miss for word: {word}, generating with AI")
+            logger.info("Cache miss for word: %s, generating with AI", word)
             ai_result = await self._generate_word_explanation(word)
             
             # 3. Save to cache
@@ -64,7 +61,7 @@ class WordCacheService:
             db.commit()
             db.refresh(word_definition)
             
-            logger.info(f"Word cached successfully: {word}")
+            logger.info("Word cached successfully: %s", word)
             return {
                 "success": True,
                 "cached": False,
@@ -72,7 +69,7 @@ class WordCacheService:
             }
             
         except Exception as e:
-            logger.error(f"Error getting word explanation for '{word}': {str(e)}")
+            logger.error("Error getting word explanation for '%s': %s", word, e)
             return {
                 "success": False,
                 "error": str(e),
@@ -122,17 +119,13 @@ RULES:
                 raise Exception("Empty response from AI")
             
             # Parse AI response - handle JSON code blocks
-            import json
-            response_text = response.text.strip()
-            
-            # Remove markdown code block wrapper if present
-            if response_text.startswith('```json'):
-                response_text = response_text[7:]  # Remove ```json
-            if response_text.endswith('```'):
-                response_text = response_text[:-3]  # Remove ```
-            
-            response_text = response_text.strip()
-            result = json.loads(response_text)
+            # Remove markdown code block wrapper if present (```json or bare ```)
+            response_text = response.text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+            try:
+                result = from_json(response_text)
+            except ValueError:
+                # Fallback if AI doesn't return valid JSON
+                return self._fallback_explanation(word, response.text)
             
             return {
                 "turkish_meaning": result.get("turkish_meaning", "Tanım bulunamadı"),
@@ -141,12 +134,8 @@ RULES:
                 "difficulty_level": result.get("difficulty_level", 1)
             }
             
-        except json.JSONDecodeError:
-            # Fallback if AI doesn't return valid JSON
-            return self._fallback_explanation(word, response.text if response else "")
-            
         except Exception as e:
-            logger.error(f"Error generating AI explanation for '{word}': {str(e)}")
+            logger.error("Error generating AI explanation for '%s': %s", word, e)
             return self._fallback_explanation(word, "")
     
     def _fallback_explanation(self, word: str, ai_text: str) -> Dict:
@@ -171,7 +160,7 @@ RULES:
                 "cache_enabled": True
             }
         except Exception as e:
-            logger.error(f"Error getting cache stats: {str(e)}")
+            logger.error("Error getting cache stats: %s", e)
             return {
                 "total_cached_words": 0,
                 "cache_enabled": False,